@@ -2,25 +2,59 @@
 import os
 import json
 import re
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
-from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
-from dateutil.parser import parse as du_parse
+try:
+    # Rust port of dateutil with the same API; much faster parse/relativedelta
+    from dateutil_rs import relativedelta, MO, TU, WE, TH, FR, SA, SU
+    from dateutil_rs import parse as du_parse, isoparse
+except ImportError:
+    from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
+    from dateutil.parser import parse as du_parse, isoparse
 from openai import OpenAI
 from dotenv import load_dotenv
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-REQUIRED_FIELDS = [
+@lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    # Built on first use so importing this module needs no API key / .env
+    load_dotenv()
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Parsed tool calls keyed by a hash of (prompt version, mode, state, message);
+# bump the version whenever the prompts or tool schema change.
+_EXTRACTION_CACHE_VERSION = "v1|gpt-4o"
+_EXTRACTION_CACHE_SIZE = 256
+_EXTRACTION_CACHE: "OrderedDict[str, list]" = OrderedDict()
+# Shared by every Streamlit session thread; OrderedDict reordering isn't thread-safe
+_EXTRACTION_CACHE_LOCK = threading.Lock()
+
+REQUIRED_FIELDS = (
     "location",
     "checkin_date",
     "checkout_date",
     "property_type",
     "amenities",
     "number_of_guests",
-]
+)
+
+# One bit per required field; a booking is complete when every bit is set
+_FIELD_BIT = {k: 1 << i for i, k in enumerate(REQUIRED_FIELDS)}
+_ALL_FIELDS = (1 << len(REQUIRED_FIELDS)) - 1
+
+# Order in which _local_next_question asks for missing fields
+QUESTION_ORDER = (
+    "location",
+    "checkin_date",
+    "checkout_date",
+    "property_type",
+    "number_of_guests",
+    "amenities",
+)
 
 WEEKDAY_MAP = {
     "monday": MO, "mon": MO,
@@ -32,17 +66,126 @@ WEEKDAY_MAP = {
     "sunday": SU, "sun": SU,
 }
 
+_WEEKDAY_INDEX = {
+    "monday": 0, "mon": 0,
+    "tuesday": 1, "tue": 1, "tues": 1,
+    "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3,
+    "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5,
+    "sunday": 6, "sun": 6,
+}
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
 NUMBER_WORDS = {
     "zero": 0, "one": 1, "a": 1, "an": 1, "two": 2, "three": 3, "four": 4, "five": 5,
     "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12
 }
 
-ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# The multi-pattern scanners below avoid look-around so they also compile
+# under RE2 (linear-time DFA) when google-re2 is installed.
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# Known cities / property types, longest alternatives first so e.g.
+# "tiny house" wins over "house" and "quebec city" over a bare prefix.
+_CITY_RE = _re_engine.compile(
+    r"(?i)\b(mont-tremblant|niagara falls|quebec city|vancouver|montreal|whistler|toronto|tofino|sutton|magog)\b"
+)
+_PTYPE_RE = _re_engine.compile(
+    r"\b(tiny house|farmhouse|penthouse|apartment|bungalow|chalet|studio|cabin|condo|hotel|house)s?\b"
+)
+# Amenity vocabulary as one alternation; items are canonicalised only on a full match
+_AMENITY_RE = _re_engine.compile(
+    r"\b(?:rooftop pool|hot tub|jacuzzi|air conditioning|wi-?fi|wireless internet|parking|pool|gym"
+    r"|kitchen|fireplace|balcony|ac|bbq|garden|pet-friendly|lake access|ocean view|city view"
+    r"|solar power|compost toilet|washer|dryer|heating)\b"
+)
+
+# Pure greetings / thanks only: yes/no/ok-style words can answer the pending question
+# (e.g. "no" to the amenities prompt), so those still go to the model
+_SMALLTALK_RE = re.compile(
+    r"(?:hi|hello|hey|thanks|thank you|cool|great)(?:\s+there)?[!.? ]*",
+    re.IGNORECASE,
+)
+
+_NUM_TOKEN = r"\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_WD_TOKEN = "|".join(sorted(WEEKDAY_MAP, key=len, reverse=True))
+
+# One alternation for every relative-date form; branches are tried in the same
+# order the old if-chain used, and the outer group that matched names the form.
+_RELDATE_RE = _re_engine.compile(
+    r"(?P<today>today$)"
+    r"|(?P<tomorrow>(?:tomorrow|tmrw|tmr)$)"
+    rf"|(?P<in_days>(?:in\s+)?(?P<nd>{_NUM_TOKEN})\s+days?)"
+    rf"|(?P<in_weeks>(?:in\s+)?(?P<nw>{_NUM_TOKEN})\s+weeks?)"
+    rf"|(?P<in_months>(?:in\s+)?(?P<nm>{_NUM_TOKEN})\s+months?)"
+    rf"|(?P<next_wd>next\s+(?P<nwd>{_WD_TOKEN})\b)"
+    rf"|(?P<this_wd>(?:this|on)\s+(?P<twd>{_WD_TOKEN})\b)"
+    rf"|(?P<bare_wd>(?:{_WD_TOKEN})$)"
+    r"|(?P<iso>\d{4}-\d{2}-\d{2}$)"
+    r"|(?P<slash>(?P<sa>\d{1,2})[/-](?P<sb>\d{1,2})[/-](?P<sc>\d{2,4}))"
+)
+# Every _RELDATE_RE branch starts with one of these characters; anything else
+# (e.g. "dec 16", "june 5", "hello") skips the alternation entirely. This is only a
+# coarse first-character check: "a"/"an" and the weekday and number words put
+# a, e, f, m, s, w and z in the set, so "aug 16" or "may 3" still try the regex
+# and fall through to _MONTH_DAY_RE when it doesn't match.
+_RELDATE_FIRST = frozenset(
+    "tino0123456789" + "".join(w[0] for w in NUMBER_WORDS) + "".join(w[0] for w in WEEKDAY_MAP)
+)
+
+_RELDATE_KINDS = (
+    "today", "tomorrow", "in_days", "in_weeks", "in_months",
+    "next_wd", "this_wd", "bare_wd", "iso", "slash",
+)
+
+# "aug 16", "august 16th, 2026", "16 aug 2026"
+_MONTH_DAY_RE = re.compile(
+    r"(?:(?P<mon>[a-z]+)\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+    r"|(?P<day2>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<mon2>[a-z]+)\.?)"
+    r"(?:,?\s+(?P<year>\d{4}))?"
+)
 
 def _to_iso(d: date) -> str:
-    return d.strftime("%Y-%m-%d")
+    return d.isoformat()
+
+_MONTH_DAYS = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _is_valid_ymd(y: int, m: int, d: int) -> bool:
+    if y < 1 or not 1 <= m <= 12 or not 1 <= d <= _MONTH_DAYS[m]:
+        return False
+    return m != 2 or d < 29 or (y % 4 == 0 and (y % 100 != 0 or y % 400 == 0))
+
+def _is_iso_shape(s: str) -> bool:
+    """Fixed-width YYYY-MM-DD check without a regex."""
+    return (
+        len(s) == 10 and s[4] == "-" and s[7] == "-" and s.isascii()
+        and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit()
+    )
+
+def _parse_iso_fast(s: str) -> Optional[date]:
+    """YYYY-MM-DD via fixed-width slicing; None if the shape or the date is invalid."""
+    if not _is_iso_shape(s):
+        return None
+    y, m, d = int(s[0:4]), int(s[5:7]), int(s[8:10])
+    return date(y, m, d) if _is_valid_ymd(y, m, d) else None
 
 def _word_to_int(token: str) -> Optional[int]:
+    # _RELDATE_RE groups are already lowercase and trimmed: try them verbatim first
+    if token.isdigit():
+        return int(token)
+    n = NUMBER_WORDS.get(token)
+    if n is not None:
+        return n
     token = token.lower().strip()
     if token.isdigit():
         return int(token)
@@ -51,70 +194,49 @@ def _word_to_int(token: str) -> Optional[int]:
 def _resolve_relative_date(text: str, now: datetime) -> Optional[str]:
     if not text:
         return None
-    s = text.strip().lower()
+    return _resolve_relative_date_cached(text.strip().lower(), now.date().toordinal())
 
-    if s == "today":
-        return _to_iso(now.date())
-    if s in {"tomorrow", "tmrw", "tmr"}:
-        return _to_iso((now + timedelta(days=1)).date())
+@lru_cache(maxsize=1024)
+def _resolve_relative_date_cached(s: str, today_ord: int) -> Optional[str]:
+    # Only the calendar day matters, so (text, day) is a safe cache key
+    now = datetime.combine(date.fromordinal(today_ord), datetime.min.time())
 
-    m = re.match(r"(in\s+)?([a-z0-9]+)\s+day(s)?", s)
-    if m:
-        n = _word_to_int(m.group(2))
-        if n is not None:
-            return _to_iso((now + timedelta(days=n)).date())
+    m = _RELDATE_RE.match(s) if s[:1] in _RELDATE_FIRST else None
+    # RE2 and re disagree on lastgroup with nested groups, so pick the outer branch explicitly
+    kind = next(k for k in _RELDATE_KINDS if m.group(k) is not None) if m else None
 
-    m = re.match(r"(in\s+)?([a-z0-9]+)\s+week(s)?", s)
-    if m:
-        n = _word_to_int(m.group(2))
-        if n is not None:
-            return _to_iso((now + timedelta(weeks=n)).date())
+    if kind == "today":
+        return _to_iso(now.date())
+    if kind == "tomorrow":
+        return _to_iso((now + timedelta(days=1)).date())
 
-    m = re.match(r"(in\s+)?([a-z0-9]+)\s+month(s)?", s)
-    if m:
-        n = _word_to_int(m.group(2))
-        if n is not None:
-            return _to_iso((now + relativedelta(months=+n)).date())
+    if kind == "in_days":
+        return _to_iso((now + timedelta(days=_word_to_int(m.group("nd")))).date())
+    if kind == "in_weeks":
+        return _to_iso((now + timedelta(weeks=_word_to_int(m.group("nw")))).date())
+    if kind == "in_months":
+        return _to_iso((now + relativedelta(months=+_word_to_int(m.group("nm")))).date())
 
-    if re.match(r"(a|an)\s+week\s+from\s+now", s):
-        return _to_iso((now + timedelta(weeks=1)).date())
-    if re.match(r"(a|an)\s+month\s+from\s+now", s):
-        return _to_iso((now + relativedelta(months=+1)).date())
+    if kind == "next_wd":
+        d = (now + relativedelta(weekday=WEEKDAY_MAP[m.group("nwd")](+1))).date()
+        return _to_iso(d)
 
-    m = re.match(r"next\s+([a-z]+)", s)
-    if m:
-        wd = m.group(1)
-        if wd in WEEKDAY_MAP:
-            d = (now + relativedelta(weekday=WEEKDAY_MAP[wd](+1))).date()
-            return _to_iso(d)
+    if kind == "this_wd":
+        target_idx = _WEEKDAY_INDEX[m.group("twd")]
+        delta = (target_idx - now.weekday()) % 7
+        d = (now + timedelta(days=delta)).date()
+        return _to_iso(d)
 
-    m = re.match(r"(this|on)\s+([a-z]+)", s)
-    if m:
-        wd = m.group(2)
-        if wd in WEEKDAY_MAP:
-            target_idx = ["monday","tuesday","wednesday","thursday","friday","saturday","sunday"].index(
-                next(full for full in ["monday","tuesday","wednesday","thursday","friday","saturday","sunday"]
-                     if full.startswith(wd[:3]))
-            )
-            delta = (target_idx - now.weekday()) % 7
-            d = (now + timedelta(days=delta)).date()
-            return _to_iso(d)
-
-    if s in WEEKDAY_MAP:
+    if kind == "bare_wd":
         d = (now + relativedelta(weekday=WEEKDAY_MAP[s](+1))).date()
         return _to_iso(d)
 
-    if ISO_RE.match(s):
-        try:
-            y, m, d = map(int, s.split("-"))
-            _ = date(y, m, d)
+    if kind == "iso":
+        if _parse_iso_fast(s):
             return s
-        except Exception:
-            pass
 
-    m = re.match(r"(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})", s)
-    if m:
-        a, b, c = m.groups()
+    if kind == "slash":
+        a, b, c = m.group("sa", "sb", "sc")
         mm, dd, yy = int(a), int(b), int(c)
         if yy < 100:
             yy += 2000
@@ -126,15 +248,121 @@ def _resolve_relative_date(text: str, now: datetime) -> Optional[str]:
             except ValueError:
                 pass
 
+    # Month-name dates via a table lookup instead of dateutil's tokenizer
+    m = _MONTH_DAY_RE.fullmatch(s)
+    if m:
+        mon = _MONTHS.get(m.group("mon") or m.group("mon2"))
+        if mon:
+            dd = int(m.group("day") or m.group("day2"))
+            yy = int(m.group("year")) if m.group("year") else now.year
+            if _is_valid_ymd(yy, mon, dd):
+                return _to_iso(date(yy, mon, dd))
+
+    # Strict ISO-8601 (e.g. "2025-08-16t15:00") is far cheaper than the fuzzy parser.
+    # Full dates only: isoparse reads "2026" / "2026-08" as the 1st, where the fuzzy
+    # parser fills the missing parts from today.
+    if _is_iso_shape(s[:10]):
+        try:
+            return _to_iso(isoparse(s).date())
+        except (ValueError, OverflowError):
+            pass
+
     try:
         dt = du_parse(s, fuzzy=True, dayfirst=False, default=now)
         return _to_iso(dt.date())
     except Exception:
         return None
 
+@lru_cache(maxsize=1024)
+def _ensure_iso_date_cached(s: str, today_ord: int) -> Optional[str]:
+    today = date.fromordinal(today_ord)
+
+    parsed = _parse_iso_fast(s)
+    if parsed:
+        # Common case: already a plausible ISO date, return it untouched
+        if parsed.year >= today.year - 1:
+            return s
+        try:
+            candidate = parsed.replace(year=today.year)
+            if candidate < today:
+                candidate = parsed.replace(year=today.year + 1)
+            return _to_iso(candidate)
+        except ValueError:
+            pass
+
+    return _resolve_relative_date_cached(s.lower(), today_ord)
+
 class BookingAgent:
-    def __init__(self, tz: str = "America/Toronto"):
+    _SYSTEM_PROMPT = (
+        "You are a very friendly and helpful booking agent named Dr. House. "
+        "Extract any booking details from the user's last message and call the tool. "
+        "For dates, DO NOT convert relative phrases yourself—pass them as the user said "
+        "(e.g., 'today', 'next friday', 'in two weeks', 'a month from now'). "
+        "If the user mentions BOTH check-in and check-out, pass both."
+    )
+
+    _TOOL_SCHEMA = [
+        {
+            "type": "function",
+            "function": {
+                "name": "update_booking",
+                "description": "Update any booking fields found in the user's message.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "location": {"type": "string"},
+                        "checkin_date": {"type": "string"},
+                        "checkout_date": {"type": "string"},
+                        "property_type": {"type": "string"},
+                        "amenities": {
+                            "oneOf": [
+                                {"type": "array", "items": {"type": "string"}},
+                                {"type": "string"}
+                            ]
+                        },
+                        # accept string or integer to avoid tool call rejection
+                        "number_of_guests": {
+                            "oneOf": [{"type": "integer"}, {"type": "string"}]
+                        },
+                    },
+                    "additionalProperties": False,
+                },
+            },
+        }
+    ]
+
+    # Opt-in (llm_followup): the extraction call also writes the follow-up question
+    _SYSTEM_PROMPT_FOLLOWUP = _SYSTEM_PROMPT + (
+        " Then call ask_next_question with ONE short, friendly follow-up for the next detail "
+        "still missing after this message. Be specific; don't repeat known info. No preambles."
+    )
+
+    _TOOL_SCHEMA_FOLLOWUP = _TOOL_SCHEMA + [
+        {
+            "type": "function",
+            "function": {
+                "name": "ask_next_question",
+                "description": "Ask the user for the next missing booking detail.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"question": {"type": "string"}},
+                    "required": ["question"],
+                    "additionalProperties": False,
+                },
+            },
+        }
+    ]
+
+    def __init__(self, tz: str = "America/Toronto", llm_followup: bool = False):
         self.tz = tz
+        # Follow-up questions are templated locally; set True to have the model phrase them
+        # (in the same completion as extraction)
+        self.llm_followup = llm_followup
+        self._tzinfo = ZoneInfo(tz)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the collected booking details; settings and timezone are kept."""
         self.booking_info: Dict[str, Optional[Any]] = {
             "location": None,
             "checkin_date": None,   # ISO YYYY-MM-DD
@@ -143,14 +371,19 @@ class BookingAgent:
             "amenities": None,      # list[str]
             "number_of_guests": None,
         }
+        self._final_cache: Optional[str] = None
+        self._filled = 0  # _FIELD_BIT mask of fields holding a non-empty value
 
     def _is_complete(self) -> bool:
-        return all(self.booking_info.get(k) not in (None, "", []) for k in REQUIRED_FIELDS)
+        return self._filled == _ALL_FIELDS
 
     def _missing_fields(self):
-        return [k for k in REQUIRED_FIELDS if not self.booking_info.get(k)]
+        filled = self._filled
+        return [k for k in REQUIRED_FIELDS if not filled & _FIELD_BIT[k]]
 
     def _final_json(self) -> str:
+        if self._final_cache is not None:
+            return self._final_cache
         data = {
             "location": self.booking_info["location"],
             "date_checkin": self.booking_info["checkin_date"],
@@ -159,91 +392,127 @@ class BookingAgent:
             "amenities": self.booking_info["amenities"],
             "number_of_guests": self.booking_info["number_of_guests"],
         }
-        return json.dumps(data, indent=2)
+        self._final_cache = json.dumps(data, separators=(",", ":"))
+        return self._final_cache
 
     def _parse_amenities(self, value) -> Optional[list]:
         if value is None:
             return None
         if isinstance(value, list):
-            out = [str(x).strip() for x in value if str(x).strip()]
-            return out or None
-        if isinstance(value, str):
-            out = [x.strip() for x in value.split(",") if x.strip()]
-            return out or None
-        # ignore unknown types
-        return None
+            items = [str(x) for x in value]
+        elif isinstance(value, str):
+            items = value.split(",")
+        else:
+            # ignore unknown types
+            return None
+        out = []
+        for x in items:
+            x = x.strip()
+            if x:
+                # Canonicalise exact known amenities; keep anything else verbatim so
+                # phrases like "no parking needed" don't turn into a must-have
+                m = _AMENITY_RE.fullmatch(x.lower())
+                out.append(m.group(0) if m else x)
+        return list(dict.fromkeys(out)) or None
 
     def _ensure_iso_date(self, value: Optional[str]) -> Optional[str]:
         if not value:
             return None
         s = str(value).strip()
-        now = datetime.now(ZoneInfo(self.tz))
-
-        if ISO_RE.match(s):
-            try:
-                y, m, d = map(int, s.split("-"))
-                candidate = date(y, m, d)
-                if y < now.year - 1:
-                    candidate = date(now.year, m, d)
-                    if candidate < now.date():
-                        candidate = date(now.year + 1, m, d)
-                return _to_iso(candidate)
-            except Exception:
-                pass
-
-        resolved = _resolve_relative_date(s, now)
-        return resolved
-
-    def _normalize_and_update(self, updates: Dict[str, Any]) -> None:
+        now = datetime.now(self._tzinfo)
+        return _ensure_iso_date_cached(s, now.date().toordinal())
+
+    def _set_field(self, field: str, value: Any) -> bool:
+        if self.booking_info[field] == value:
+            return False
+        self.booking_info[field] = value
+        self._final_cache = None
+        if value:
+            self._filled |= _FIELD_BIT[field]
+        else:
+            self._filled &= ~_FIELD_BIT[field]
+        return True
+
+    def _normalize_and_update(self, updates: Dict[str, Any]) -> bool:
+        """Apply extracted fields to booking_info; True if any stored value changed."""
         if not updates:
-            return
+            return False
+        changed = False
 
         if "location" in updates and updates["location"]:
-            self.booking_info["location"] = str(updates["location"]).strip()
+            loc = str(updates["location"]).strip()
+            m = _CITY_RE.search(loc)
+            changed |= self._set_field("location", m.group(1) if m else loc)
 
-        if "checkin_date" in updates and updates["checkin_date"]:
+        # The model often echoes the stored ISO value back; no need to re-resolve it
+        if "checkin_date" in updates and updates["checkin_date"] and updates["checkin_date"] != self.booking_info["checkin_date"]:
             iso = self._ensure_iso_date(updates["checkin_date"])
             if iso:
-                self.booking_info["checkin_date"] = iso
+                changed |= self._set_field("checkin_date", iso)
 
-        if "checkout_date" in updates and updates["checkout_date"]:
+        if "checkout_date" in updates and updates["checkout_date"] and updates["checkout_date"] != self.booking_info["checkout_date"]:
             iso = self._ensure_iso_date(updates["checkout_date"])
             if iso:
-                self.booking_info["checkout_date"] = iso
+                changed |= self._set_field("checkout_date", iso)
 
         if "property_type" in updates and updates["property_type"]:
             pt = str(updates["property_type"]).lower()
-            if "hotel" in pt:
-                pt = "hotel"
-            self.booking_info["property_type"] = pt
+            m = _PTYPE_RE.search(pt)
+            if m:
+                pt = m.group(1)
+            changed |= self._set_field("property_type", pt)
 
         if "amenities" in updates:
-            self.booking_info["amenities"] = self._parse_amenities(updates["amenities"])
+            # The model sees the current state and returns the full list, so replace it
+            changed |= self._set_field("amenities", self._parse_amenities(updates["amenities"]))
 
         if "number_of_guests" in updates and updates["number_of_guests"] is not None:
             try:
-                self.booking_info["number_of_guests"] = int(updates["number_of_guests"])
+                changed |= self._set_field("number_of_guests", int(updates["number_of_guests"]))
             except Exception:
                 # try word-to-int
                 n = _word_to_int(str(updates["number_of_guests"]))
                 if n is not None:
-                    self.booking_info["number_of_guests"] = n
+                    changed |= self._set_field("number_of_guests", n)
 
         # Ensure checkout > checkin
         ci = self.booking_info.get("checkin_date")
         co = self.booking_info.get("checkout_date")
-        if ci and co:
+        # Both are canonical YYYY-MM-DD, so string order is date order
+        if ci and co and co <= ci:
             try:
-                y1, m1, d1 = map(int, ci.split("-"))
-                y2, m2, d2 = map(int, co.split("-"))
-                ci_d = date(y1, m1, d1)
-                co_d = date(y2, m2, d2)
-                if co_d <= ci_d:
-                    co_d = ci_d + timedelta(days=1)
-                    self.booking_info["checkout_date"] = _to_iso(co_d)
+                ci_d = date(int(ci[0:4]), int(ci[5:7]), int(ci[8:10]))
+                changed |= self._set_field("checkout_date", _to_iso(ci_d + timedelta(days=1)))
             except Exception:
                 pass
 
+        return changed
+
+    def _local_update(self, user_message: str) -> bool:
+        """Fill the next missing field from a bare answer (e.g. "3", "tomorrow", "Montreal")."""
+        filled = self._filled
+        if filled == _ALL_FIELDS:
+            return False
+        # Same order _local_next_question asks in, so a bare reply answers that question
+        field = next(k for k in QUESTION_ORDER if not filled & _FIELD_BIT[k])
+        text = user_message.strip()
+        low = text.lower()
+
+        if field == "number_of_guests":
+            ok = _word_to_int(low) is not None
+        elif field in ("checkin_date", "checkout_date"):
+            ok = _is_iso_shape(low) or _RELDATE_RE.fullmatch(low) is not None
+        elif field == "location":
+            ok = _CITY_RE.fullmatch(text) is not None
+        elif field == "property_type":
+            ok = _PTYPE_RE.fullmatch(low) is not None
+        else:
+            ok = False
+
+        if not ok:
+            return False
+        return self._normalize_and_update({field: text})
+
     # -------- LOCAL KEEP-ALIVE QUESTION (no API needed) --------
     def _local_next_question(self) -> str:
         missing = self._missing_fields()
@@ -265,125 +534,93 @@ class BookingAgent:
         # Fallback generic
         return "Tell me a bit more so I can finish your booking details."
 
+    def _extract(self, user_message: str) -> list:
+        """Return the model's tool calls as (name, args) pairs, cached per (state, message)."""
+        key = hashlib.sha256(
+            "|".join((
+                _EXTRACTION_CACHE_VERSION,
+                "followup" if self.llm_followup else "",
+                json.dumps(self.booking_info, sort_keys=True),
+                user_message,
+            )).encode("utf-8")
+        ).hexdigest()
+        with _EXTRACTION_CACHE_LOCK:
+            cached = _EXTRACTION_CACHE.get(key)
+            if cached is not None:
+                _EXTRACTION_CACHE.move_to_end(key)
+                return cached
+
+        # With llm_followup the same completion also phrases the next question
+        extraction = _get_client().chat.completions.create(
+            model="gpt-4o",
+            temperature=0.2,
+            # Tool arguments (+ one question) are short; cap runaway generations
+            max_tokens=256,
+            messages=[
+                {
+                    "role": "system",
+                    "content": self._SYSTEM_PROMPT_FOLLOWUP if self.llm_followup else self._SYSTEM_PROMPT,
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        "Current state:\n"
+                        + json.dumps(self.booking_info, separators=(",", ":"))
+                        + "\n\nUser said:\n"
+                        + user_message
+                    ),
+                },
+            ],
+            tools=self._TOOL_SCHEMA_FOLLOWUP if self.llm_followup else self._TOOL_SCHEMA,
+            # let the model decide; avoids hard failure when it doesn't want to call the tool
+            tool_choice="auto",
+        )
+
+        calls = []
+        for call in extraction.choices[0].message.tool_calls or []:
+            if getattr(call, "type", "") == "function" and getattr(call, "function", None):
+                args = {}
+                if call.function.arguments:
+                    try:
+                        args = json.loads(call.function.arguments)
+                    except Exception:
+                        args = {}
+                calls.append((call.function.name, args))
+
+        with _EXTRACTION_CACHE_LOCK:
+            _EXTRACTION_CACHE[key] = calls
+            if len(_EXTRACTION_CACHE) > _EXTRACTION_CACHE_SIZE:
+                _EXTRACTION_CACHE.popitem(last=False)
+        return calls
+
     def run(self, user_message: str) -> str:
         # If already complete, return final JSON
+        if self._final_cache is not None:
+            return self._final_cache
         if self._is_complete():
             return self._final_json()
 
-        system_prompt = (
-            "You are a very friendly and helpful booking agent named Dr. House. "
-            "Extract any booking details from the user's last message and call the tool. "
-            "For dates, DO NOT convert relative phrases yourself—pass them as the user said "
-            "(e.g., 'today', 'next friday', 'in two weeks', 'a month from now'). "
-            "If the user mentions BOTH check-in and check-out, pass both."
-        )
-
-        tool_schema = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "update_booking",
-                    "description": "Update any booking fields found in the user's message.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "location": {"type": "string"},
-                            "checkin_date": {"type": "string"},
-                            "checkout_date": {"type": "string"},
-                            "property_type": {"type": "string"},
-                            "amenities": {
-                                "oneOf": [
-                                    {"type": "array", "items": {"type": "string"}},
-                                    {"type": "string"}
-                                ]
-                            },
-                            # accept string or integer to avoid tool call rejection
-                            "number_of_guests": {
-                                "oneOf": [{"type": "integer"}, {"type": "string"}]
-                            },
-                        },
-                        "additionalProperties": False,
-                    },
-                },
-            }
-        ]
+        # Greetings / thanks carry no booking details; don't spend a model call
+        if _SMALLTALK_RE.fullmatch(user_message.strip()):
+            return self._local_next_question()
 
         try:
-            # 1) Try to extract structured fields from the user's message
-            extraction = client.chat.completions.create(
-                model="gpt-4o",
-                temperature=0.2,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": (
-                            "Current state:\n"
-                            + json.dumps(self.booking_info, indent=2)
-                            + "\n\nUser said:\n"
-                            + user_message
-                        ),
-                    },
-                ],
-                tools=tool_schema,
-                # let the model decide; avoids hard failure when it doesn't want to call the tool
-                tool_choice="auto",
-            )
-
-            updated_anything = False
-            tool_calls = extraction.choices[0].message.tool_calls or []
-            for call in tool_calls:
-                if getattr(call, "type", "") == "function" and getattr(call, "function", None):
-                    if call.function.name == "update_booking":
-                        args = {}
-                        if call.function.arguments:
-                            try:
-                                args = json.loads(call.function.arguments)
-                            except Exception:
-                                args = {}
-                        before = self.booking_info.copy()
+            # 1) Try to extract structured fields from the user's message;
+            #    a bare answer to the next missing field needs no model call
+            question = ""
+            if not self._local_update(user_message):
+                for name, args in self._extract(user_message):
+                    if name == "update_booking":
                         self._normalize_and_update(args)
-                        if self.booking_info != before:
-                            updated_anything = True
+                    elif name == "ask_next_question":
+                        question = str(args.get("question") or "").strip()
 
             # 2) If complete, return final JSON
             if self._is_complete():
                 return self._final_json()
 
-            # 3) Ask ONE concise follow-up (model) OR fall back locally
-            missing = self._missing_fields()
-
-            # If the model didn't update anything, it's often better to continue anyway
-            # with a direct, targeted question to keep the chat alive.
-            try:
-                followup = client.chat.completions.create(
-                    model="gpt-4o",
-                    temperature=0.4,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": (
-                                "Ask ONE short, friendly follow-up to get the next missing detail(s). "
-                                "Be specific; don't repeat known info. No preambles."
-                            ),
-                        },
-                        {
-                            "role": "user",
-                            "content": (
-                                "Known so far:\n"
-                                + json.dumps(self.booking_info, indent=2)
-                                + "\n\nMissing (in order): "
-                                + ", ".join(missing)
-                                + "\n\nWrite exactly one concise question."
-                            ),
-                        },
-                    ],
-                )
-                question = (followup.choices[0].message.content or "").strip()
-                return question if question else self._local_next_question()
-            except Exception:
-                # If the follow-up generation fails, use local fallback
-                return self._local_next_question()
+            # 3) Ask ONE concise follow-up: the model's, or the local template
+            return question or self._local_next_question()
 
         except Exception:
             # Any upstream API error: keep the chat alive with a local question
@@ -31,14 +31,18 @@ _DEFAULT_COOKIE = {
 }
 
 # -------------------- YAML I/O --------------------
+# libyaml-backed (C) loader/dumper when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 def _save_yaml(data: dict, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     with path.open("w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+        yaml.dump(data, f, Dumper=_YAML_DUMPER, sort_keys=False, allow_unicode=True)
 
 def _load_yaml(path: Path) -> dict:
     with path.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+        return yaml.load(f, Loader=_YAML_LOADER) or {}
 
 # -------------------- Config management --------------------
 def _make_first_run_config() -> dict:
@@ -60,14 +64,25 @@ def _make_first_run_config() -> dict:
         "preauthorized": {"emails": []},
     }
 
+# (st_mtime_ns, validated config); skips re-validating an unchanged file on reruns
+_CFG_CACHE: Optional[Tuple[int, dict]] = None
+
 def _ensure_config() -> dict:
     """Ensure YAML exists and is consistent; hash any stray plaintext passwords."""
+    global _CFG_CACHE
     if not _CONFIG_PATH.exists():
         cfg = _make_first_run_config()
         _save_yaml(cfg, _CONFIG_PATH)
+        _CFG_CACHE = (_CONFIG_PATH.stat().st_mtime_ns, cfg)
         return cfg
 
+    mtime = _CONFIG_PATH.stat().st_mtime_ns
+    if _CFG_CACHE and _CFG_CACHE[0] == mtime:
+        return _CFG_CACHE[1]
+
     cfg = _load_yaml(_CONFIG_PATH)
+    changed = not all(k in cfg for k in ("credentials", "cookie", "preauthorized"))
+    changed |= "usernames" not in cfg.get("credentials", {})
     cfg.setdefault("credentials", {}).setdefault("usernames", {})
     cfg.setdefault("cookie", _DEFAULT_COOKIE)
     cfg.setdefault("preauthorized", {"emails": []})
@@ -77,8 +92,12 @@ def _ensure_config() -> dict:
         pw = str(record.get("password", "") or "")
         if pw and not stauth.Hasher.is_hash(pw):
             record["password"] = stauth.Hasher.hash(pw)
+            changed = True
 
-    _save_yaml(cfg, _CONFIG_PATH)
+    # Only rewrite the file when something was actually fixed up
+    if changed:
+        _save_yaml(cfg, _CONFIG_PATH)
+    _CFG_CACHE = (_CONFIG_PATH.stat().st_mtime_ns, cfg)
     return cfg
 
 def _build_authenticator(cfg: dict) -> stauth.Authenticate:
@@ -2,27 +2,64 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+
+# matplotlib and sklearn are imported inside the functions that use them so
+# importing this module (and the login page) doesn't pay for them up front.
+
+# Numeric work is cached on the raw column arrays; figures are rebuilt each run.
+@st.cache_data(show_spinner=False)
+def _price_hist(prices: np.ndarray, bins: int = 30):
+    return np.histogram(prices, bins=bins)
+
+@st.cache_data(show_spinner=False)
+def _city_avg(cities: np.ndarray, prices: np.ndarray, top: int = 20) -> pd.Series:
+    # factorize + bincount instead of groupby; NaN cities/prices are skipped
+    codes, uniques = pd.factorize(cities)
+    prices = prices.astype(np.float64, copy=False)
+    mask = (codes >= 0) & ~np.isnan(prices)
+    sums = np.bincount(codes[mask], weights=prices[mask], minlength=len(uniques))
+    counts = np.bincount(codes[mask], minlength=len(uniques))
+    keep = counts > 0
+    means, names = sums[keep] / counts[keep], np.asarray(uniques)[keep]
+    if len(means) > top:
+        idx = np.argpartition(-means, top - 1)[:top]
+    else:
+        idx = np.arange(len(means))
+    idx = idx[np.argsort(-means[idx], kind="stable")]
+    return pd.Series(means[idx], index=names[idx])
+
+@st.cache_data(show_spinner=False)
+def _cluster_labels(coords: np.ndarray, k: int) -> np.ndarray:
+    from sklearn.cluster import MiniBatchKMeans
+    kmeans = MiniBatchKMeans(
+        n_clusters=max(1, k), n_init=3, batch_size=min(1024, len(coords)), random_state=42
+    )
+    return kmeans.fit_predict(coords)
 
 def price_distribution(df: pd.DataFrame):
+    import matplotlib.pyplot as plt
     st.subheader("Price Distribution")
+    counts, edges = _price_hist(df["price"].dropna().to_numpy(dtype=np.float32))
     fig, ax = plt.subplots()
-    ax.hist(df["price"].dropna(), bins=30)
+    ax.stairs(counts, edges, fill=True)
     ax.set_xlabel("Price")
     ax.set_ylabel("Count")
     st.pyplot(fig, clear_figure=True)
 
 def avg_price_by_city(df: pd.DataFrame):
+    import matplotlib.pyplot as plt
     st.subheader("Average Price by City")
-    city_price = df.groupby("city")["price"].mean().sort_values(ascending=False).head(20)
+    city_price = _city_avg(df["city"].to_numpy(), df["price"].to_numpy())
     fig, ax = plt.subplots()
     city_price.plot(kind="bar", ax=ax)
     ax.set_xlabel("City")
     ax.set_ylabel("Avg Price")
     st.pyplot(fig, clear_figure=True)
 
+_MAX_SCATTER_POINTS = 5000
+
 def location_clusters(df: pd.DataFrame, k: int = 5):
+    import matplotlib.pyplot as plt
     if not {"latitude", "longitude"}.issubset(df.columns):
         st.info("No latitude/longitude columns found to cluster locations.")
         return
@@ -32,10 +69,14 @@ def location_clusters(df: pd.DataFrame, k: int = 5):
         st.info("No coordinates to cluster.")
         return
     k = min(k, len(coords)) if len(coords) > 0 else 1
-    kmeans = KMeans(n_clusters=max(1, k), n_init="auto", random_state=42)
-    labels = kmeans.fit_predict(coords)
+    xy = coords.to_numpy()
+    labels = _cluster_labels(xy, k)
+    # Cluster on every point but only draw a fixed-seed sample of large sets
+    if len(xy) > _MAX_SCATTER_POINTS:
+        idx = np.random.default_rng(0).choice(len(xy), _MAX_SCATTER_POINTS, replace=False)
+        xy, labels = xy[idx], labels[idx]
     fig, ax = plt.subplots()
-    scatter = ax.scatter(coords["longitude"], coords["latitude"], c=labels)
+    scatter = ax.scatter(xy[:, 1], xy[:, 0], c=labels)
     ax.set_xlabel("Longitude")
     ax.set_ylabel("Latitude")
     ax.set_title(f"{k} Clusters")
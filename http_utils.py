@@ -0,0 +1,24 @@
+# http_utils.py
+import json
+import threading
+
+import requests
+
+# orjson is optional; it only speeds up the image maps and Unsplash response parsing
+try:
+    from orjson import loads as json_loads, dumps as json_dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(d: dict) -> bytes:
+        return json.dumps(d, separators=(",", ":")).encode("utf-8")
+
+# Pooled keep-alive connections instead of a new TCP/TLS handshake per request.
+# requests.Session isn't thread-safe, so each thread (script runs, workers) gets its own.
+_THREAD_LOCAL = threading.local()
+
+def thread_http() -> requests.Session:
+    http = getattr(_THREAD_LOCAL, "http", None)
+    if http is None:
+        http = _THREAD_LOCAL.http = requests.Session()
+    return http
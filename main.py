@@ -15,22 +15,32 @@ def pretty_print_recs(recs):
         print(f"    Bedrooms: {r.get('bedrooms','N/A')}")
         print(f"    Amenities: {r.get('amenities','N/A')}")
 
+_SELECT_RE = re.compile(r"(book|select)\s+(id\s+)?(\d+)$")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+_QUIT = frozenset({"quit", "exit"})
+_RESTART = frozenset({"new", "restart"})
+_YES = frozenset({"yes", "y"})
+_NO = frozenset({"no", "n"})
+
 def try_parse_selection(user_input: str, recs):
     """Return chosen listing_id or None. Accepts 'book 2', 'book id 55', 'select 3', or just '2'."""
     s = user_input.strip().lower()
-    m = re.search(r"(book|select)\s+(id\s+)?(\d+)$", s)
+    # Most picks are a bare index; no regex needed
+    if s.isdigit():
+        idx = int(s)
+        if 1 <= idx <= len(recs):
+            return recs[idx-1]["listing_id"]
+        return None
+    m = _SELECT_RE.search(s)
     if m:
         num = int(m.group(3))
-        ids = [int(r["listing_id"]) for r in recs if "listing_id" in r]
+        ids = [r["listing_id"] for r in recs if "listing_id" in r]
         if num in ids:
             return num
         if 1 <= num <= len(recs):  # treat as index
-            return int(recs[num-1]["listing_id"])
+            return recs[num-1]["listing_id"]
         return None
-    if s.isdigit():
-        idx = int(s)
-        if 1 <= idx <= len(recs):
-            return int(recs[idx-1]["listing_id"])
     return None
 
 def main():
@@ -52,12 +62,13 @@ def main():
             user_input = input("You: ").strip()
             if user_input == "":
                 continue
-            if user_input.lower() in {"quit", "exit"}:
+            low = user_input.lower()
+            if low in _QUIT:
                 print("Dr. House: No problem—ping me anytime. Bye!")
                 break
-            if user_input.lower() in {"new", "restart"}:
+            if low in _RESTART:
                 # reset everything
-                booking_agent = BookingAgent()
+                booking_agent.reset()
                 stage = "collect"
                 last_criteria = None
                 last_recs = []
@@ -116,12 +127,12 @@ def main():
                 stage = "confirm_email"
 
             elif stage == "confirm_email":
-                if "@" not in user_input or "." not in user_input.split("@")[-1]:
+                if not _EMAIL_RE.match(user_input):
                     print("Dr. House: Could you provide a valid email?")
                     continue
                 customer["email"] = user_input
 
-                chosen = next((r for r in last_recs if int(r["listing_id"]) == int(pending_listing_id)), None)
+                chosen = next((r for r in last_recs if r["listing_id"] == pending_listing_id), None)
                 print("\nDr. House: Please confirm the reservation details:")
                 print(f"  Listing: {chosen.get('name')} (ID {chosen.get('listing_id')})")
                 print(f"  Location: {chosen.get('location')} | Type: {chosen.get('property_type')}")
@@ -131,11 +142,10 @@ def main():
                 stage = "confirm_book"
 
             elif stage == "confirm_book":
-                s = user_input.strip().lower()
-                if s not in {"yes", "y", "no", "n"}:
+                if low not in _YES and low not in _NO:
                     print("Dr. House: Please reply 'yes' to confirm or 'no' to cancel.")
                     continue
-                if s in {"no", "n"}:
+                if low in _NO:
                     print("Dr. House: No problem. Want to choose another option?")
                     stage = "choose"
                     continue
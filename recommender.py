@@ -1,7 +1,12 @@
+import csv
+import os
 import pandas as pd
+import numpy as np
 import re
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, date
+from functools import cached_property, lru_cache
 
 AMENITY_SYNONYMS = {
     "wifi": [r"\bwifi\b", r"\bwi-?fi\b", r"wireless internet"],
@@ -11,22 +16,40 @@ AMENITY_SYNONYMS = {
     "parking": [r"parking", r"free parking"],
 }
 
+# Synonym patterns compiled once at import rather than on every recommend()
+_COMPILED_SYNONYMS = {
+    k: [re.compile(v, flags=re.IGNORECASE) for v in vs] for k, vs in AMENITY_SYNONYMS.items()
+}
+
+@lru_cache(maxsize=256)
+def _compile_escaped(key: str) -> "re.Pattern":
+    return re.compile(re.escape(key), flags=re.IGNORECASE)
+
 def _normalize_amenity_patterns(amenities: List[str]):
     pats = []
     for a in amenities:
         key = str(a).strip().lower()
-        variants = AMENITY_SYNONYMS.get(key, [re.escape(key)])
-        for v in variants:
-            pats.append(re.compile(v, flags=re.IGNORECASE))
+        variants = _COMPILED_SYNONYMS.get(key)
+        if variants is None:
+            variants = [_compile_escaped(key)]
+        pats.extend(variants)
     return pats
 
+_PRICE_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)")
+
 def _parse_price(value) -> Optional[float]:
     if value is None:
         return None
-    s = str(value)
-    m = re.search(r"([0-9]+(?:\.[0-9]+)?)", s.replace(",", ""))
+    # read_csv usually types the column as numeric already; only strings need the regex
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return None if value != value else abs(float(value))
+    m = _PRICE_RE.search(str(value).replace(",", ""))
     return float(m.group(1)) if m else None
 
+# Process-wide: after a cache clear or a CSV change, an old and a new Recommender can both be
+# live, so bookings serialise here and consult the shared status sidecar, not just their own mask
+_RESERVE_LOCK = threading.Lock()
+
 def _parse_iso(d: str) -> date:
     y, m, d = map(int, d.split("-"))
     return date(y, m, d)
@@ -35,33 +58,119 @@ class Recommender:
     def __init__(self, csv_path: str = "listings.csv", reservations_path: str = "reservations.csv"):
         self.csv_path = csv_path
         self.reservations_path = reservations_path
-        self.df = pd.read_csv(csv_path)
+        # Bookings are appended here instead of rewriting listings.csv each time
+        self.status_path = os.path.splitext(csv_path)[0] + "_status.csv"
+        self._contains_masks: Dict[Tuple[str, str], np.ndarray] = {}
+        # The CSV and the indexes derived from it are built on first use (cached_property),
+        # so constructing a Recommender costs nothing until a search or booking happens.
+
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        df = pd.read_csv(self.csv_path)
         # Normalize some columns
         for col in ["amenities", "location", "property_type", "availability", "name"]:
-            if col in self.df.columns:
-                self.df[col] = self.df[col].astype(str)
+            if col in df.columns:
+                df[col] = df[col].astype(str)
+        # Plain ints, so records carry int ids and callers compare them without int()
+        if "listing_id" in df.columns:
+            df["listing_id"] = df["listing_id"].astype(int)
+        self._apply_status_overrides(df)
+        return df
 
-    def recommend(self, criteria: Dict[str, Any], top_k: int = 5) -> List[Dict[str, Any]]:
-        df = self.df.copy()
+    @cached_property
+    def _id_to_row(self) -> Dict[int, Any]:
+        # listing_id -> index label; reversed so the first row wins on duplicate ids,
+        # as the old boolean lookup did. Rebuild if rows are ever added.
+        if "listing_id" not in self.df.columns:
+            return {}
+        ids = self.df["listing_id"].tolist()
+        return dict(zip(reversed(ids), reversed(self.df.index.tolist())))
+
+    @cached_property
+    def _avail_mask(self) -> np.ndarray:
+        # Query-independent row filter, built once instead of rescanned per recommend().
+        # Availability lives here as bools; the string column is only kept for output.
+        if "availability" in self.df.columns:
+            # copy=True: reserve() flips entries in place, and pandas 3 hands out read-only views
+            return self.df["availability"].str.strip().str.lower().eq("available").to_numpy(dtype=bool, copy=True)
+        return np.ones(len(self.df), dtype=bool)
 
-        # 1) Availability
-        if "availability" in df.columns:
-            df = df[df["availability"].str.contains("Available", case=False, na=False)]
+    @cached_property
+    def _lower(self) -> Dict[str, pd.Series]:
+        # Lowercased once; location/property-type matching is case-insensitive on every query
+        return {col: self.df[col].str.lower() for col in ("location", "property_type") if col in self.df.columns}
+
+    @cached_property
+    def _bedrooms(self) -> Optional[np.ndarray]:
+        # Bedrooms as a plain int array, indexed by row position
+        if "bedrooms" in self.df.columns:
+            try:
+                return self.df["bedrooms"].fillna(0).astype(np.int16).to_numpy()
+            except Exception:
+                pass
+        return None
+
+    def _apply_status_overrides(self, df: pd.DataFrame) -> None:
+        """Overlay availability changes recorded in the status sidecar (last entry wins)."""
+        if "availability" not in df.columns or "listing_id" not in df.columns:
+            return
+        try:
+            with open(self.status_path, newline="", encoding="utf-8") as f:
+                overrides = {r["listing_id"]: r["availability"] for r in csv.DictReader(f)}
+        except (FileNotFoundError, KeyError):
+            return
+        if overrides:
+            ids = df["listing_id"].astype(str)
+            hit = ids.isin(overrides.keys())
+            df.loc[hit, "availability"] = ids[hit].map(overrides)
+
+    def _sidecar_status(self, listing_id: int) -> Optional[str]:
+        """Latest availability recorded in the status sidecar for one listing, if any."""
+        key = str(listing_id)
+        status = None
+        try:
+            with open(self.status_path, newline="", encoding="utf-8") as f:
+                for r in csv.DictReader(f):
+                    if r.get("listing_id") == key:
+                        status = r.get("availability")
+        except FileNotFoundError:
+            return None
+        return status
+
+    def _contains_mask(self, col: str, needle: str) -> np.ndarray:
+        """Case-insensitive substring mask over a whole column, memoised per (col, needle)."""
+        key = (col, needle.lower())
+        m = self._contains_masks.get(key)
+        if m is None:
+            # User text is a literal substring, not a pattern
+            m = self._lower[col].str.contains(key[1], regex=False, na=False).to_numpy()
+            if len(self._contains_masks) >= 256:
+                self._contains_masks.clear()
+            self._contains_masks[key] = m
+        return m
+
+    def recommend(self, criteria: Dict[str, Any], top_k: int = 5) -> List[Dict[str, Any]]:
+        src = self.df
+        # Availability, location and property type combine into one mask over full columns
+        # 1) Availability (precomputed; reserve() keeps it in sync)
+        mask = self._avail_mask
 
         # 2) Location (contains)
         loc = (criteria.get("location") or "").strip()
-        if loc and "location" in df.columns:
-            df = df[df["location"].str.contains(loc, case=False, na=False)]
-        if df.empty:
+        if loc and "location" in self._lower:
+            mask = mask & self._contains_mask("location", loc)
+        if not mask.any():
             return []
 
-        # 3) Property type (soft filter)
+        # 3) Property type (soft filter: ignored if it would leave nothing)
         pt_req = (criteria.get("property_type") or "").strip().lower()
-        df_pt = df
-        if pt_req and "property_type" in df.columns:
-            tmp = df[df["property_type"].str.lower().str.contains(pt_req, na=False)]
-            if not tmp.empty:
-                df_pt = tmp
+        if pt_req and "property_type" in self._lower:
+            narrowed = mask & self._contains_mask("property_type", pt_req)
+            if narrowed.any():
+                mask = narrowed
+
+        # Work on row positions; the frame is materialised once, after all filters
+        rows = np.flatnonzero(mask)
 
         # 4) Amenity scoring
         requested_amenities = criteria.get("amenities") or []
@@ -69,31 +178,27 @@ class Recommender:
             requested_amenities = [x.strip() for x in requested_amenities.split(",") if x.strip()]
         amen_patterns = _normalize_amenity_patterns(requested_amenities)
 
-        def amenity_score(s: str) -> int:
-            if not amen_patterns:
-                return 0
-            t = s or ""
-            return sum(1 for p in amen_patterns if p.search(t))
-
-        if "amenities" in df_pt.columns:
-            df_pt = df_pt.copy()
-            df_pt["amenity_matches"] = df_pt["amenities"].apply(amenity_score)
-        else:
-            df_pt = df_pt.copy()
-            df_pt["amenity_matches"] = 0
+        scores = np.zeros(rows.size, dtype=np.int64)
+        if "amenities" in src.columns and amen_patterns:
+            # One column-wide scan per pattern (same count as testing each pattern per row)
+            text = src["amenities"].iloc[rows].fillna("")
+            for p in amen_patterns:
+                scores += text.str.contains(p, na=False).to_numpy()
 
         # 5) Guests → soft capacity via bedrooms (if column exists)
         guests = criteria.get("number_of_guests")
-        if guests and "bedrooms" in df_pt.columns:
+        if guests and self._bedrooms is not None:
             try:
-                import math
-                needed = max(1, math.ceil(int(guests) / 2))
-                df_pt = df_pt[df_pt["bedrooms"].fillna(0).astype(int) >= needed]
-            except Exception:
-                pass
+                needed = max(1, (int(guests) + 1) // 2)
+            except (TypeError, ValueError):
+                needed = None
+            if needed is not None:
+                keep = self._bedrooms[rows] >= needed
+                rows, scores = rows[keep], scores[keep]
 
-        if df_pt.empty:
+        if rows.size == 0:
             return []
+        df_pt = src.iloc[rows].assign(amenity_matches=scores)
 
         # 6) Sort for best options
         sort_cols, asc = ["amenity_matches"], [False]
@@ -101,7 +206,12 @@ class Recommender:
             sort_cols.append("rating"); asc.append(False)
         if "reviews_count" in df_pt.columns:
             sort_cols.append("reviews_count"); asc.append(False)
-        df_pt = df_pt.sort_values(by=sort_cols, ascending=asc)
+        # All keys are descending, so a top-k heap replaces the full sort
+        try:
+            df_pt = df_pt.nlargest(top_k, sort_cols)
+        except TypeError:
+            # non-numeric rating/reviews columns can't go through nlargest
+            df_pt = df_pt.sort_values(by=sort_cols, ascending=asc)
 
         # 7) Output fields
         output_cols_priority = [
@@ -129,13 +239,14 @@ class Recommender:
         customer = customer or {}
 
         # 1) find listing
-        rows = self.df[self.df["listing_id"] == int(listing_id)]
-        if rows.empty:
+        idx = self._id_to_row.get(int(listing_id))
+        if idx is None:
             raise ValueError("Listing not found.")
-        row = rows.iloc[0]
+        row = self.df.loc[idx]
+        pos = self.df.index.get_loc(idx)
 
         # 2) check availability
-        if str(row.get("availability", "")).lower() != "available":
+        if not self._avail_mask[pos]:
             raise ValueError("Sorry, this listing is no longer available.")
 
         # 3) compute price estimate
@@ -149,7 +260,8 @@ class Recommender:
         estimated_total = round((price_per_night or 0.0) * nights, 2)
 
         # 4) create reservation record
-        ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        now = datetime.utcnow()
+        ts = f"{now.year:04d}{now.month:02d}{now.day:02d}{now.hour:02d}{now.minute:02d}{now.second:02d}"
         reservation_id = f"R-{listing_id}-{ts}"
 
         reservation = {
@@ -175,24 +287,50 @@ class Recommender:
             "username": username,
         }
 
-        # 5) persist: mark listing as Booked and save CSV
-        idx = rows.index[0]
-        self.df.at[idx, "availability"] = "Booked"
-        self.df.to_csv(self.csv_path, index=False)
+        # 5) persist under the lock: re-check, mark Booked in memory, record it in the sidecar
+        with _RESERVE_LOCK:
+            if not self._avail_mask[pos]:
+                raise ValueError("Sorry, this listing is no longer available.")
+            # Another instance may have booked it since this one loaded; the sidecar is shared
+            recorded = self._sidecar_status(int(row["listing_id"]))
+            if recorded is not None and recorded.strip().lower() != "available":
+                self._avail_mask[pos] = False
+                self.df.at[idx, "availability"] = recorded
+                raise ValueError("Sorry, this listing is no longer available.")
+            # Mask first, then the frame; both are rolled back if the sidecar can't be written
+            prev_availability = self.df.at[idx, "availability"]
+            self._avail_mask[pos] = False
+            self.df.at[idx, "availability"] = "Booked"
+            try:
+                new_file = not os.path.exists(self.status_path) or os.path.getsize(self.status_path) == 0
+                with open(self.status_path, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(["listing_id", "availability", "updated_utc"])
+                    writer.writerow([int(row["listing_id"]), "Booked", ts])
+            except Exception:
+                self.df.at[idx, "availability"] = prev_availability
+                self._avail_mask[pos] = True
+                raise
 
-        # 6) append to reservations.csv (create headers if file empty/missing)
-        try:
+            # 6) append to reservations.csv (create headers if file empty/missing)
             try:
-                existing = pd.read_csv(self.reservations_path)
-            except FileNotFoundError:
-                existing = pd.DataFrame()
-            except pd.errors.EmptyDataError:
-                existing = pd.DataFrame()
-
-            updated = pd.concat([existing, pd.DataFrame([reservation])], ignore_index=True)
-            updated.to_csv(self.reservations_path, index=False)
-        except Exception:
-            # If writing reservations fails, still keep listing as booked; but surface a warning
-            reservation["warning"] = "Failed to record reservation to reservations.csv, but listing marked Booked."
+                path = self.reservations_path
+                fieldnames = list(reservation)
+                write_header = True
+                if os.path.exists(path) and os.path.getsize(path) > 0:
+                    # Follow the existing header so columns stay aligned
+                    with open(path, newline="", encoding="utf-8") as f:
+                        header = next(csv.reader(f), None)
+                    if header:
+                        fieldnames, write_header = header, False
+                with open(path, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                    if write_header:
+                        writer.writeheader()
+                    writer.writerow(reservation)
+            except Exception:
+                # If writing reservations fails, still keep listing as booked; but surface a warning
+                reservation["warning"] = "Failed to record reservation to reservations.csv, but listing marked Booked."
 
         return reservation
@@ -3,15 +3,21 @@ from __future__ import annotations
 
 import json
 import re
+from collections import deque, namedtuple
+from itertools import islice
 from pathlib import Path
 
-import pandas as pd
 import streamlit as st
 
 from auth import gate  # <-- Auth gate
-from agent import BookingAgent
-from recommender import Recommender
-from ui_frontend import render_recommendations  # cards with images
+# agent / recommender / ui_frontend are imported where first used, so the
+# login screen (and its reruns) never pays for OpenAI, numpy or PIL imports
+
+# orjson is optional; it only speeds up parsing the agent's criteria JSON
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 # ---------------- UI ----------------
 st.set_page_config(page_title="Dr. House — Booking Agent", page_icon="🧳", layout="wide")
@@ -22,21 +28,84 @@ if not auth_status:
     st.info("Please log in above to continue.")
     st.stop()
 
+# Only signed-in sessions reach the reservations table and admin tools that need pandas
+import pandas as pd
+
 # ---------------- Helpers & State ----------------
+LISTINGS_PATH = "listings.csv"
+MAX_MESSAGES = 200  # chat history kept per session; oldest messages drop off first
+
+@st.cache_resource(show_spinner=False)
+def _get_recommender(csv_path: str, mtime_ns: int) -> "Recommender":
+    # One parsed Recommender shared by every session; a new mtime builds a fresh one
+    from recommender import Recommender
+    return Recommender(csv_path=csv_path)
+
+def shared_recommender() -> "Recommender":
+    p = Path(LISTINGS_PATH)
+    return _get_recommender(LISTINGS_PATH, p.stat().st_mtime_ns if p.exists() else 0)
+
+# Parse hints for reservations.csv: ids stay strings (no float/int guessing on
+# sparse columns) and username, the filter key, is low-cardinality
+_RES_DTYPES = {
+    "reservation_id": "string",
+    "username": "category",
+    "guest_name": "string",
+    "guest_email": "string",
+    "status": "category",
+    "created_utc": "string",
+}
+
+@st.cache_data(show_spinner=False)
+def load_reservations(path: str, mtime_ns: int, size: int) -> pd.DataFrame:
+    # (mtime, size) in the key: reruns reuse the parsed frame until the file changes
+    try:
+        return pd.read_csv(path, dtype=_RES_DTYPES)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+@st.cache_data(show_spinner=False)
+def reservation_rows_by_user(path: str, mtime_ns: int, size: int) -> dict:
+    # username -> row positions, grouped once per file version for every user
+    res_df = load_reservations(path, mtime_ns, size)
+    if res_df.empty or "username" not in res_df.columns:
+        return {}
+    return res_df.groupby("username", sort=False, observed=True).indices
+
+@st.cache_data(show_spinner=False)
+def load_my_reservations(path: str, mtime_ns: int, size: int, username: str) -> pd.DataFrame:
+    # Per-user slice cached alongside the file, so reruns skip the lookup entirely
+    rows = reservation_rows_by_user(path, mtime_ns, size).get(username)
+    if rows is None:
+        return pd.DataFrame()
+    my_df = load_reservations(path, mtime_ns, size).iloc[rows]
+    # reserve() appends, so the file is normally already in created_utc order
+    if "created_utc" in my_df.columns and my_df["created_utc"].is_monotonic_increasing:
+        my_df = my_df.iloc[::-1]
+    else:
+        my_df = my_df.sort_values("created_utc", ascending=False)
+    return my_df.reset_index(drop=True)
+
+@st.cache_data(show_spinner=False)
+def my_reservations_csv(path: str, mtime_ns: int, size: int, username: str) -> bytes:
+    # Download payload, serialised once per file version instead of on every rerun
+    return load_my_reservations(path, mtime_ns, size, username).to_csv(index=False).encode("utf-8")
+
 def init_state():
     if "booking_agent" not in st.session_state:
+        from agent import BookingAgent
         st.session_state.booking_agent = BookingAgent()
     if "recommender" not in st.session_state:
-        st.session_state.recommender = Recommender(csv_path="listings.csv")
+        st.session_state.recommender = shared_recommender()
     if "stage" not in st.session_state:
         # collect -> choose -> confirm_book -> idle
         st.session_state.stage = "collect"
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=MAX_MESSAGES)
     if "last_criteria" not in st.session_state:
         st.session_state.last_criteria = None
-    if "last_recs" not in st.session_state:
-        st.session_state.last_recs = []
+    if "last_recs_by_id" not in st.session_state:
+        set_recs(st.session_state.get("last_recs", []))
     if "pending_listing_id" not in st.session_state:
         st.session_state.pending_listing_id = None
     if "selected_listing" not in st.session_state:
@@ -44,35 +113,56 @@ def init_state():
     if "show_recs" not in st.session_state:
         st.session_state.show_recs = False  # only true when stage == "choose"
 
+def set_recs(recs):
+    # Keep an id -> rec index next to the list so selections don't rescan it
+    st.session_state.last_recs = recs
+    st.session_state.last_recs_by_id = {int(r["listing_id"]): r for r in recs if "listing_id" in r}
+
+# Chat records are small tuples rather than per-message dicts
+Msg = namedtuple("Msg", "role content")
+
 def say(role: str, content: str):
-    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.messages.append(Msg(role, content))
+
+CHAT_WINDOW = 30  # messages rendered per rerun unless full history is requested
 
+# Fragments rerun on their own widget interactions instead of the whole script
+# (st.fragment on Streamlit >= 1.37, experimental before that; plain call otherwise)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+@fragment
 def render_chat():
-    for m in st.session_state.messages:
-        with st.chat_message(m["role"]):
-            st.markdown(m["content"])
+    msgs = st.session_state.messages
+    hidden = len(msgs) - CHAT_WINDOW
+    if hidden > 0 and not st.toggle(f"Show {hidden} earlier messages", key="show_full_chat"):
+        msgs = islice(msgs, hidden, None)
+    for role, content in msgs:
+        with st.chat_message(role):
+            st.markdown(content)
+
+_SELECT_RE = re.compile(r"(book|select)\s+(id\s+)?(\d+)$")
 
-def try_parse_selection(user_input: str, recs):
+def try_parse_selection(user_input: str, recs, recs_by_id):
     """Return listing_id or None. Accepts 'book 2', 'book id 55', 'select 3', or just '2'."""
     s = user_input.strip().lower()
-    m = re.search(r"(book|select)\s+(id\s+)?(\d+)$", s)
+    # Most picks are a bare index; no regex needed
+    if s.isdigit():
+        idx = int(s)
+        if 1 <= idx <= len(recs):
+            return int(recs[idx-1]["listing_id"])
+        return None
+    m = _SELECT_RE.search(s)
     if m:
         num = int(m.group(3))
-        ids = [int(r["listing_id"]) for r in recs if "listing_id" in r]
-        if num in ids:
+        if num in recs_by_id:
             return num
         if 1 <= num <= len(recs):  # index
             return int(recs[num-1]["listing_id"])
-        return None
-    if s.isdigit():
-        idx = int(s)
-        if 1 <= idx <= len(recs):
-            return int(recs[idx-1]["listing_id"])
     return None
 
 def hide_recs():
     st.session_state.show_recs = False
-    st.session_state.last_recs = []
+    set_recs([])
     st.session_state.pending_listing_id = None
 
 def end_flow(msg: str):
@@ -81,30 +171,79 @@ def end_flow(msg: str):
     say("assistant", msg + " Type **restart** to start a new search.")
 
 def reset_all():
-    st.session_state.booking_agent = BookingAgent()
-    st.session_state.recommender = Recommender(csv_path="listings.csv")
+    # Same agent object, cleared; the recommender is the shared cached instance
+    st.session_state.booking_agent.reset()
+    st.session_state.recommender = shared_recommender()
     st.session_state.stage = "collect"
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_MESSAGES)
     st.session_state.last_criteria = None
-    st.session_state.last_recs = []
+    set_recs([])
     st.session_state.pending_listing_id = None
     st.session_state.selected_listing = None
     st.session_state.show_recs = False
 
+def confirm_prompt(chosen, crit) -> str:
+    chosen = chosen or {}
+    crit = crit or {}
+    return (
+        "**Please confirm the reservation details:**\n"
+        f"- Listing: **{chosen.get('name','(unknown)')}** (ID `{chosen.get('listing_id','?')}`)\n"
+        f"- Location: {chosen.get('location','?')} | Type: {chosen.get('property_type','?')}\n"
+        f"- Check-in: {crit.get('date_checkin')} | Check-out: {crit.get('date_checkout')} | Guests: {crit.get('number_of_guests')}\n"
+        f"- Price per night: {chosen.get('price_per_night','?')} *(taxes/fees may apply)*\n\n"
+        "Type **yes** to confirm or **no** to cancel."
+    )
+
+# Declared column types for the reservations table, so Streamlit doesn't infer them per render
+_RES_COLUMN_CONFIG = {
+    "reservation_id": st.column_config.TextColumn("Reservation"),
+    "listing_id": st.column_config.NumberColumn("Listing", format="%d"),
+    "price_per_night": st.column_config.NumberColumn("Price/night"),
+    "rating": st.column_config.NumberColumn("Rating", format="%.1f"),
+    "reviews_count": st.column_config.NumberColumn("Reviews", format="%d"),
+    "date_checkin": st.column_config.TextColumn("Check-in"),
+    "date_checkout": st.column_config.TextColumn("Check-out"),
+    "number_of_guests": st.column_config.NumberColumn("Guests", format="%d"),
+    "nights": st.column_config.NumberColumn("Nights", format="%d"),
+    "estimated_total": st.column_config.NumberColumn("Est. total", format="%.2f"),
+    "created_utc": st.column_config.TextColumn("Created (UTC)"),
+}
+
+@fragment
+def render_my_reservations(res_path: Path, username: str):
+    st.subheader("📒 My Reservations")
+    my_df = pd.DataFrame()
+    res_key = None
+    try:
+        # One stat serves as the existence check and the cache key
+        res_stat = res_path.stat()
+    except FileNotFoundError:
+        res_stat = None
+    if res_stat is not None and res_stat.st_size > 0:
+        try:
+            res_key = (str(res_path), res_stat.st_mtime_ns, res_stat.st_size, username)
+            my_df = load_my_reservations(*res_key)
+        except Exception as e:
+            st.warning(f"Could not load reservations.csv: {e}")
+
+    if not my_df.empty:
+        st.dataframe(my_df, use_container_width=True, height=280, column_config=_RES_COLUMN_CONFIG)
+        st.download_button(
+            "Download my reservations (CSV)",
+            data=my_reservations_csv(*res_key),
+            file_name=f"my_reservations_{username}.csv",
+            mime="text/csv",
+        )
+    else:
+        st.info("No reservations yet for your account.")
+
 def current_listing_id():
+    # Both sources hold ints: ids are cast where they're assigned and recommend() returns int ids
     lid = st.session_state.get("pending_listing_id")
     if lid is not None:
-        try:
-            return int(lid)
-        except Exception:
-            pass
+        return lid
     sel = st.session_state.get("selected_listing")
-    if sel and sel.get("listing_id") is not None:
-        try:
-            return int(sel["listing_id"])
-        except Exception:
-            pass
-    return None
+    return sel.get("listing_id") if sel else None
 
 # ---------- Init after successful auth ----------
 init_state()
@@ -119,35 +258,8 @@ with st.sidebar:
     authenticator.logout("Logout", location="sidebar")
 
     # --- My Reservations (per-user) ---
-    st.subheader("📒 My Reservations")
     res_path = Path("reservations.csv")
-    if res_path.exists() and res_path.stat().st_size > 0:
-        try:
-            res_df = pd.read_csv(res_path)
-        except pd.errors.EmptyDataError:
-            res_df = pd.DataFrame()
-        except Exception as e:
-            st.warning(f"Could not load reservations.csv: {e}")
-            res_df = pd.DataFrame()
-    else:
-        res_df = pd.DataFrame()
-
-    if not res_df.empty and "username" in res_df.columns:
-        my_df = res_df[res_df["username"] == username].copy()
-    else:
-        my_df = pd.DataFrame()
-
-    if not my_df.empty:
-        my_df = my_df.sort_values("created_utc", ascending=False).reset_index(drop=True)
-        st.dataframe(my_df, use_container_width=True, height=280)
-        st.download_button(
-            "Download my reservations (CSV)",
-            data=my_df.to_csv(index=False),
-            file_name=f"my_reservations_{username}.csv",
-            mime="text/csv",
-        )
-    else:
-        st.info("No reservations yet for your account.")
+    render_my_reservations(res_path, username)
 
     # Admin: reset reservations / unbook listings
     st.divider()
@@ -171,19 +283,38 @@ with st.sidebar:
                     "number_of_guests","nights","estimated_total","status",
                     "created_utc","username"
                 ]).to_csv(res_path, index=False)
+                load_reservations.clear()
+                reservation_rows_by_user.clear()
+                load_my_reservations.clear()
+                my_reservations_csv.clear()
                 st.success("reservations.csv cleared.")
             except Exception as e:
                 st.error(f"Failed clearing reservations.csv: {e}")
 
             # Optionally unbook listings
+            listings_changed = False
             if also_unbook:
                 try:
-                    lst_path = Path("listings.csv")
+                    lst_path = Path(LISTINGS_PATH)
                     if lst_path.exists():
-                        lst_df = pd.read_csv(lst_path)
-                        if "availability" in lst_df.columns:
-                            lst_df["availability"] = "Available"
-                            lst_df.to_csv(lst_path, index=False)
+                        header = pd.read_csv(lst_path, nrows=0).columns
+                        if "availability" in header:
+                            # Bookings live in the status sidecar now; listings.csv only needs a
+                            # rewrite if it still carries non-Available rows from older versions
+                            avail = pd.read_csv(
+                                lst_path, usecols=["availability"], dtype={"availability": "category"}
+                            )["availability"]
+                            if not avail.eq("Available").all():
+                                lst_df = pd.read_csv(lst_path)
+                                lst_df["availability"] = "Available"
+                                lst_df.to_csv(lst_path, index=False)
+                                listings_changed = True
+                            # Drop per-booking overrides so they don't re-book on reload
+                            try:
+                                Path(st.session_state.recommender.status_path).unlink()
+                                listings_changed = True
+                            except FileNotFoundError:
+                                pass
                             st.success("All listings marked Available.")
                         else:
                             st.warning("listings.csv missing 'availability' column.")
@@ -192,8 +323,10 @@ with st.sidebar:
                 except Exception as e:
                     st.error(f"Failed to unbook listings: {e}")
 
-            # reload recommender so it sees updated listings.csv
-            st.session_state.recommender = Recommender(csv_path="listings.csv")
+            # reload recommender only if listings.csv or the sidecar actually changed
+            if listings_changed:
+                _get_recommender.clear()
+                st.session_state.recommender = shared_recommender()
             say("assistant", "Reservations reset. Start fresh anytime!")
             st.rerun()
 
@@ -208,56 +341,47 @@ render_chat()
 
 # ---- Recommendations panel (only when choosing and allowed) ----
 if st.session_state.stage == "choose" and st.session_state.last_recs and st.session_state.show_recs:
+    from ui_frontend import render_recommendations  # cards with images
     selected_id = render_recommendations(st.session_state.last_recs, columns=3)
     if selected_id is not None:
-        chosen = next(
-            (r for r in st.session_state.last_recs if str(r.get("listing_id")) == str(selected_id)),
-            None
-        )
+        selected_id = int(selected_id)
+        chosen = st.session_state.last_recs_by_id.get(selected_id)
         st.session_state.pending_listing_id = selected_id
         st.session_state.selected_listing = chosen
         hide_recs()
         if chosen:
             say("assistant", f"Great choice! **{chosen.get('name')}** (ID `{chosen.get('listing_id')}`)")
         # Go straight to confirm step (no name/email prompts)
-        crit = st.session_state.last_criteria or {}
-        say(
-            "assistant",
-            (
-                "**Please confirm the reservation details:**\n"
-                f"- Listing: **{(chosen or {}).get('name','(unknown)')}** (ID `{(chosen or {}).get('listing_id','?')}`)\n"
-                f"- Location: {(chosen or {}).get('location','?')} | Type: {(chosen or {}).get('property_type','?')}\n"
-                f"- Check-in: {crit.get('date_checkin')} | Check-out: {crit.get('date_checkout')} | Guests: {crit.get('number_of_guests')}\n"
-                f"- Price per night: {(chosen or {}).get('price_per_night','?')} *(taxes/fees may apply)*\n\n"
-                "Type **yes** to confirm or **no** to cancel."
-            )
-        )
+        say("assistant", confirm_prompt(chosen, st.session_state.last_criteria))
         st.session_state.stage = "confirm_book"
         st.rerun()
 
 # ---- Chat input ----
-user_text = st.chat_input("Type your message…")
-if user_text is not None:
-    # Basic commands
-    if user_text.strip().lower() in {"quit", "exit"}:
-        say("user", user_text)
-        end_flow("No problem—ping me anytime. Bye!")
-        st.rerun()
+def on_quit():
+    end_flow("No problem—ping me anytime. Bye!")
 
-    if user_text.strip().lower() in {"restart", "new"}:
-        say("user", user_text)
-        reset_all()
-        say("assistant", "Fresh start! Tell me what you’re looking for.")
-        st.rerun()
+def on_restart():
+    reset_all()
+    say("assistant", "Fresh start! Tell me what you’re looking for.")
+
+COMMANDS = {"quit": on_quit, "exit": on_quit, "restart": on_restart, "new": on_restart}
+
+def handle_user_text(user_text: str):
+    """Apply one chat message to the session state; the caller reruns once afterwards."""
+    cmd = user_text.strip().lower()
+    say("user", user_text)
+    # Basic commands
+    handler = COMMANDS.get(cmd)
+    if handler:
+        handler()
+        return
 
     # If in idle, only allow restart/new
     if st.session_state.stage == "idle":
-        say("user", user_text)
         say("assistant", "We’re all set. Type **restart** to begin a new search.")
-        st.rerun()
+        return
 
     # Normal flow
-    say("user", user_text)
     stage = st.session_state.stage
     agent = st.session_state.booking_agent
     rec = st.session_state.recommender
@@ -265,40 +389,29 @@ if user_text is not None:
     # ----- Stage: collect or choose (refine) -----
     if stage in {"collect", "choose"}:
         if stage == "choose":
-            listing_id = try_parse_selection(user_text, st.session_state.last_recs)
+            listing_id = try_parse_selection(
+                user_text, st.session_state.last_recs, st.session_state.last_recs_by_id
+            )
             if listing_id is not None:
                 st.session_state.pending_listing_id = listing_id
-                chosen = next(
-                    (r for r in st.session_state.last_recs if str(r.get("listing_id")) == str(listing_id)),
-                    None
-                )
+                chosen = st.session_state.last_recs_by_id.get(listing_id)
                 st.session_state.selected_listing = chosen
                 hide_recs()
-                crit = st.session_state.last_criteria or {}
-                say(
-                    "assistant",
-                    (
-                        "**Please confirm the reservation details:**\n"
-                        f"- Listing: **{(chosen or {}).get('name','(unknown)')}** (ID `{(chosen or {}).get('listing_id','?')}`)\n"
-                        f"- Location: {(chosen or {}).get('location','?')} | Type: {(chosen or {}).get('property_type','?')}\n"
-                        f"- Check-in: {crit.get('date_checkin')} | Check-out: {crit.get('date_checkout')} | Guests: {crit.get('number_of_guests')}\n"
-                        f"- Price per night: {(chosen or {}).get('price_per_night','?')}\n\n"
-                        "Type **yes** to confirm or **no** to cancel."
-                    )
-                )
+                say("assistant", confirm_prompt(chosen, st.session_state.last_criteria))
                 st.session_state.stage = "confirm_book"
-                st.rerun()
+                return
 
         # Otherwise, let the agent process user text
         agent_reply = agent.run(user_text)
-        if agent_reply.strip().startswith("{") and agent_reply.strip().endswith("}"):
+        stripped = agent_reply.strip()
+        if stripped[:1] == "{" and stripped[-1:] == "}":
             try:
-                st.session_state.last_criteria = json.loads(agent_reply)
+                st.session_state.last_criteria = _json_loads(stripped)
             except Exception:
                 say("assistant", "I had trouble reading your preferences JSON. Mind repeating?")
-                st.rerun()
+                return
 
-            st.session_state.last_recs = rec.recommend(st.session_state.last_criteria, top_k=5)
+            set_recs(rec.recommend(st.session_state.last_criteria, top_k=5))
             if st.session_state.last_recs:
                 say("assistant", "I found options — open the **Recommended options** panel above to review and book.")
                 st.session_state.stage = "choose"
@@ -312,10 +425,9 @@ if user_text is not None:
 
     # ----- Stage: confirm_book -----
     elif stage == "confirm_book":
-        s = user_text.strip().lower()
-        if s not in {"yes", "y", "no", "n"}:
+        if cmd not in {"yes", "y", "no", "n"}:
             say("assistant", "Please reply **yes** to confirm or **no** to cancel.")
-        elif s in {"no", "n"}:
+        elif cmd in {"no", "n"}:
             end_flow("No problem. Reservation canceled.")
         else:
             lid = current_listing_id()
@@ -323,7 +435,7 @@ if user_text is not None:
                 say("assistant", "Hmm, I lost the selected property. Please pick it again from the list.")
                 st.session_state.stage = "choose"
                 st.session_state.show_recs = True
-                st.rerun()
+                return
 
             # Confirm => reserve (book under account; no name/email prompts)
             try:
@@ -353,4 +465,8 @@ if user_text is not None:
                 st.session_state.stage = "choose"
                 st.session_state.show_recs = False
 
+user_text = st.chat_input("Type your message…")
+if user_text is not None:
+    handle_user_text(user_text)
+    # Exactly one rerun per message, so the chat above picks up the new turns
     st.rerun()
@@ -1,12 +1,17 @@
-import os, json, time, re, hashlib
+import os, time, re, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
+import numpy as np
 import requests
 from dotenv import load_dotenv
 import streamlit as st
 from PIL import Image, ImageDraw, ImageFont
 
+from http_utils import json_loads, json_dumps, thread_http
+
 # ------------------- Appearance -------------------
 def inject_css():
     st.markdown(
@@ -55,11 +60,16 @@ SYNONYMS = {
     "tinyhome": "tiny house",
 }
 
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+# Both run per card on every rerun over a small vocabulary of inputs, so results are memoised
+@lru_cache(maxsize=512)
 def slugify(s: str) -> str:
     s = s.lower().strip()
-    s = re.sub(r"[^a-z0-9]+", "-", s)
+    s = _SLUG_RE.sub("-", s)
     return s.strip("-")
 
+@lru_cache(maxsize=512)
 def normalize_type(t: Optional[str]) -> str:
     if not t:
         return "house"
@@ -71,26 +81,43 @@ def normalize_type(t: Optional[str]) -> str:
     return t
 
 def _seed_hex_for_listing(listing: Dict) -> str:
-    raw = str(listing.get("listing_id") or listing.get("name") or listing).encode("utf-8")
-    return hashlib.md5(raw).hexdigest()
+    return _seed_hex(str(listing.get("listing_id") or listing.get("name") or listing))
+
+@lru_cache(maxsize=1024)
+def _seed_hex(raw: str) -> str:
+    # Stays MD5: the hex names cached placeholders and keys the Unsplash map on disk.
+    # Not a security use, so FIPS builds allow it.
+    return hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
 
 def _seed_int_for_listing(listing: Dict) -> int:
     return int(_seed_hex_for_listing(listing), 16)
 
 # ------------------- Local images first -------------------
+_LOCAL_IMG_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+# folder -> (st_mtime_ns, sorted image paths); a folder is rescanned only when its contents change
+_LOCAL_IMG_CACHE: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
+
 def pick_local_type_image(ptype: str, seed_int: int, base_dir: str = "assets/images") -> Optional[str]:
     """
     Look for images in assets/images/<ptype-slug>/.
     Returns a deterministic selection if found.
     """
-    p = Path(base_dir) / slugify(ptype)
-    if not p.exists():
+    p = os.path.join(base_dir, slugify(ptype))
+    try:
+        mtime = os.stat(p).st_mtime_ns
+        cached = _LOCAL_IMG_CACHE.get(p)
+        if cached and cached[0] == mtime:
+            candidates = cached[1]
+        else:
+            with os.scandir(p) as it:
+                candidates = tuple(sorted(e.path for e in it if e.name.endswith(_LOCAL_IMG_EXTS) and e.is_file()))
+            _LOCAL_IMG_CACHE[p] = (mtime, candidates)
+    except OSError:
         return None
-    candidates = sorted([*p.glob("*.jpg"), *p.glob("*.jpeg"), *p.glob("*.png"), *p.glob("*.webp")])
     if not candidates:
         return None
     idx = seed_int % len(candidates)
-    return str(candidates[idx])
+    return candidates[idx]
 
 # ------------------- Offline placeholder generator -------------------
 def _ensure_cache_dir() -> Path:
@@ -99,6 +126,8 @@ def _ensure_cache_dir() -> Path:
     return cache
 
 def _wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFont, max_width: int) -> str:
+    if not text:
+        return ""
     words = text.split()
     lines = []
     cur = ""
@@ -112,7 +141,16 @@ def _wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.FreeTypeFon
             cur = w
     if cur:
         lines.append(cur)
-    return "\njoin".replace("join", "join")(lines)
+    return "\n".join(lines)
+
+@lru_cache(maxsize=8)
+def _placeholder_font(size: int):
+    # Try to load a nicer font if available; otherwise default. Parsed once per size.
+    try:
+        custom_font_path = Path("assets/fonts/Inter-SemiBold.ttf")
+        return ImageFont.truetype(str(custom_font_path), size) if custom_font_path.exists() else ImageFont.load_default()
+    except Exception:
+        return ImageFont.load_default()
 
 def generate_placeholder_image(listing: Dict, width: int, height: int) -> str:
     """
@@ -130,38 +168,27 @@ def generate_placeholder_image(listing: Dict, width: int, height: int) -> str:
     bg = (30 + (seed % 40), 34 + ((seed >> 3) % 40), 40 + ((seed >> 6) % 40))  # dark gray variants
     accent = (120 + (seed % 100), 150 + ((seed >> 5) % 80), 255)               # blue-ish accent
 
-    img = Image.new("RGB", (width, height), bg)
+    # Simple gradient bar: one RGB value per row, computed for all rows at once
+    ratio = (np.arange(height) / height)[:, None]
+    rows = (np.asarray(bg) * (1 - ratio) + np.asarray(accent) * ratio * 0.25).astype(np.uint8)
+    img = Image.fromarray(np.repeat(rows[:, None, :], width, axis=1))
     draw = ImageDraw.Draw(img)
 
-    # Simple gradient bar
-    for y in range(height):
-        ratio = y / height
-        r = int(bg[0] * (1 - ratio) + accent[0] * ratio * 0.25)
-        g = int(bg[1] * (1 - ratio) + accent[1] * ratio * 0.25)
-        b = int(bg[2] * (1 - ratio) + accent[2] * ratio * 0.25)
-        draw.line([(0, y), (width, y)], fill=(r, g, b))
-
     # Text
     ptype = normalize_type(listing.get("property_type", "House")).title()
     loc = str(listing.get("location", "")).split(",")[0]
     title = f"{ptype}"
     subtitle = loc if loc else ""
 
-    # Try to load a nicer font if available; otherwise default
-    try:
-        custom_font_path = Path("assets/fonts/Inter-SemiBold.ttf")
-        font_title = ImageFont.truetype(str(custom_font_path), 46) if custom_font_path.exists() else ImageFont.load_default()
-        font_sub = ImageFont.truetype(str(custom_font_path), 28) if custom_font_path.exists() else ImageFont.load_default()
-    except Exception:
-        font_title = ImageFont.load_default()
-        font_sub = ImageFont.load_default()
+    font_title = _placeholder_font(46)
+    font_sub = _placeholder_font(28)
 
     margin = 28
     max_text_width = width - 2 * margin
 
     # Manual wrap (uses _wrap_text)
     title_wrapped = _wrap_text(draw, title, font_title, max_text_width)
-    sub_wrapped = _wrap_text(draw, subtitle, font_sub, max_text_width)
+    sub_wrapped = _wrap_text(draw, subtitle, font_sub, max_text_width) if subtitle else ""
 
     # Position near bottom-left
     title_w, title_h = draw.multiline_textbbox((0, 0), title_wrapped, font=font_title)[2:]
@@ -181,10 +208,14 @@ def generate_placeholder_image(listing: Dict, width: int, height: int) -> str:
         draw.multiline_text((x+1, y2+1), sub_wrapped, font=font_sub, fill=shadow, align="left")
         draw.multiline_text((x, y2), sub_wrapped, font=font_sub, fill=(220, 220, 220), align="left")
 
-    img.save(out_path, format="PNG", optimize=True)
+    # Fast zlib level: the PNG is a local one-off cache file, encode time matters more than size
+    img.save(out_path, format="PNG", compress_level=1)
     return str(out_path)
 
 # ------------------- Unsplash key + status -------------------
+# .env is read once at import; load_dotenv never overrides variables already set, so re-reading it
+# on every key lookup only repeated the file parse
+load_dotenv()
 _UNSPLASH_STATUS_SHOWN = False
 
 def _get_unsplash_key() -> Optional[str]:
@@ -195,7 +226,6 @@ def _get_unsplash_key() -> Optional[str]:
     except Exception:
         pass
     if not key:
-        load_dotenv()
         key = os.getenv("UNSPLASH_ACCESS_KEY")
     return key
 
@@ -212,17 +242,32 @@ def _show_unsplash_status(ok: bool, msg: str):
 # ------------------- On-demand Unsplash fetch (cached) -------------------
 _UNSPLASH_MAP_PATH = Path(".cache/unsplash_ui_map.json")
 
+# (st_mtime_ns, parsed map) shared by all cards/sessions; the file is re-parsed only when it changes
+_UNSPLASH_MAP: Tuple[int, dict] = (-1, {})
+_UNSPLASH_MAP_LOCK = threading.Lock()
+
 def _load_unsplash_cache() -> dict:
-    if _UNSPLASH_MAP_PATH.exists():
+    global _UNSPLASH_MAP
+    try:
+        mtime = _UNSPLASH_MAP_PATH.stat().st_mtime_ns
+    except OSError:
+        return _UNSPLASH_MAP[1]
+    if _UNSPLASH_MAP[0] != mtime:
         try:
-            return json.loads(_UNSPLASH_MAP_PATH.read_text())
+            _UNSPLASH_MAP = (mtime, json_loads(_UNSPLASH_MAP_PATH.read_bytes()))
         except Exception:
-            return {}
-    return {}
-
-def _save_unsplash_cache(d: dict):
-    _UNSPLASH_MAP_PATH.parent.mkdir(parents=True, exist_ok=True)
-    _UNSPLASH_MAP_PATH.write_text(json.dumps(d, indent=2))
+            _UNSPLASH_MAP = (mtime, {})
+    return _UNSPLASH_MAP[1]
+
+def _save_unsplash_cache(seed: str, entry: dict):
+    global _UNSPLASH_MAP
+    # Insert + write under one lock: sessions share the map, so dumps never see it mid-update
+    with _UNSPLASH_MAP_LOCK:
+        d = _load_unsplash_cache()
+        d[seed] = entry
+        _UNSPLASH_MAP_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _UNSPLASH_MAP_PATH.write_bytes(json_dumps(d))
+        _UNSPLASH_MAP = (_UNSPLASH_MAP_PATH.stat().st_mtime_ns, d)
 
 def _unsplash_query_for(listing: Dict) -> str:
     ptype = normalize_type(listing.get("property_type", "house"))
@@ -230,6 +275,51 @@ def _unsplash_query_for(listing: Dict) -> str:
     city  = loc.split(",")[0] if loc else ""
     return f"{ptype} in {city}" if city else ptype
 
+def _unsplash_search_raw(query: str, key: str, http: requests.Session) -> Optional[dict]:
+    # Plain HTTP over the given session, no st.* calls: safe on prefetch worker threads
+    r = http.get(
+        "https://api.unsplash.com/search/photos",
+        params={"query": query, "per_page": 1, "orientation": "landscape", "content_filter": "high"},
+        headers={"Authorization": f"Client-ID {key}", "Accept-Version": "v1"},
+        timeout=15,
+    )
+    # Simple backoff on rate limit
+    if r.status_code == 429:
+        time.sleep(1.5)
+        r = http.get(
+            "https://api.unsplash.com/search/photos",
+            params={"query": query, "per_page": 1, "orientation": "landscape", "content_filter": "high"},
+            headers={"Authorization": f"Client-ID {key}", "Accept-Version": "v1"},
+            timeout=15,
+        )
+    r.raise_for_status()
+    data = json_loads(r.content)
+    res = data.get("results", [])
+    return res[0] if res else None
+
+@st.cache_data(show_spinner=False)
+def _search_unsplash(query: str, key: str) -> Optional[dict]:
+    # Cached per query across sessions: listings sharing a type + city cost one API call.
+    # Errors raise and are therefore never cached. Script thread only.
+    return _unsplash_search_raw(query, key, thread_http())
+
+def _unsplash_fallback_query_for(listing: Dict) -> str:
+    # fallback try: just city or just property type
+    loc = str(listing.get("location", "")).strip()
+    city = loc.split(",")[0] if loc else ""
+    return city or normalize_type(listing.get("property_type", "house"))
+
+def _remember_unsplash(seed: str, best: Optional[dict]) -> Optional[Tuple[str, str]]:
+    """Record a search result (or a miss) in the map; returns (image_url, credit) or None."""
+    if not best:
+        _save_unsplash_cache(seed, {"image_url": "", "image_credit": ""})
+        return None
+    url = (best.get("urls") or {}).get("regular", "")
+    user = best.get("user") or {}
+    credit = f"Photo by {user.get('name','Unknown')} on Unsplash ({(user.get('links') or {}).get('html','https://unsplash.com')})"
+    _save_unsplash_cache(seed, {"image_url": url, "image_credit": credit})
+    return url, credit
+
 def fetch_unsplash_for(listing: Dict) -> Optional[Tuple[str, str]]:
     """
     Returns (image_url, credit) or None if not found.
@@ -248,64 +338,20 @@ def fetch_unsplash_for(listing: Dict) -> Optional[Tuple[str, str]]:
         it = cache[seed]
         return it["image_url"], it.get("image_credit", "")
 
-    q = _unsplash_query_for(listing)
-
-    def _search(query: str) -> Optional[dict]:
-        r = requests.get(
-            "https://api.unsplash.com/search/photos",
-            params={"query": query, "per_page": 1, "orientation": "landscape", "content_filter": "high"},
-            headers={"Authorization": f"Client-ID {key}", "Accept-Version": "v1"},
-            timeout=15,
-        )
-        # Simple backoff on rate limit
-        if r.status_code == 429:
-            time.sleep(1.5)
-            r = requests.get(
-                "https://api.unsplash.com/search/photos",
-                params={"query": query, "per_page": 1, "orientation": "landscape", "content_filter": "high"},
-                headers={"Authorization": f"Client-ID {key}", "Accept-Version": "v1"},
-                timeout=15,
-            )
-        r.raise_for_status()
-        data = r.json()
-        res = data.get("results", [])
-        return res[0] if res else None
-
     try:
-        best = _search(q)
+        best = _search_unsplash(_unsplash_query_for(listing), key)
         if not best:
-            # fallback try: just city or just property type
-            loc = str(listing.get("location", "")).strip()
-            city = loc.split(",")[0] if loc else ""
-            fallback_q = city or normalize_type(listing.get("property_type", "house"))
-            best = _search(fallback_q)
-
-        if not best:
-            cache[seed] = {"image_url": "", "image_credit": ""}
-            _save_unsplash_cache(cache)
-            return None
-
-        url = (best.get("urls") or {}).get("regular", "")
-        user = best.get("user") or {}
-        credit = f"Photo by {user.get('name','Unknown')} on Unsplash ({(user.get('links') or {}).get('html','https://unsplash.com')})"
-        cache[seed] = {"image_url": url, "image_credit": credit}
-        _save_unsplash_cache(cache)
-        return url, credit
-
+            best = _search_unsplash(_unsplash_fallback_query_for(listing), key)
+        return _remember_unsplash(seed, best)
     except Exception:
         # One-time notice already shown; just skip
         return None
 
 # ------------------- Image selection (now prefers Unsplash) -------------------
-def image_for_listing(listing: Dict, width: int = 640, height: int = 400) -> Tuple[str, Optional[str]]:
-    """
-    Returns (image_src, credit) with priority:
-      1) Provided by data: image_path (local) or image_url (remote)
-      2) Fetch from Unsplash now (and cache)
-      3) Local asset in assets/images/<property_type>/
-      4) Generated placeholder (offline, stable)
-    """
-    # 1) From data
+# seed -> (image_url, credit) for listings already resolved on Unsplash this process
+_UNSPLASH_HITS: Dict[str, Tuple[str, str]] = {}
+
+def _image_from_data(listing: Dict) -> Optional[Tuple[str, Optional[str]]]:
     image_path = str(listing.get("image_path", "") or "").strip()
     if image_path and Path(image_path).exists():
         return image_path, str(listing.get("image_credit", "") or "").strip() or None
@@ -313,22 +359,111 @@ def image_for_listing(listing: Dict, width: int = 640, height: int = 400) -> Tup
     image_url = str(listing.get("image_url", "") or "").strip()
     if image_url:
         return image_url, str(listing.get("image_credit", "") or "").strip() or None
+    return None
+
+def _resolved_images() -> Dict[Tuple[str, int, int], Tuple[str, Optional[str]]]:
+    # (seed, width, height) -> (image_src, credit), per session: reruns skip the fallback chain,
+    # while a new session still retries Unsplash for listings that missed (e.g. a transient error)
+    return st.session_state.setdefault("_resolved_images", {})
+
+# One long-lived pool for every render and session, so its workers (and the thread-local
+# Sessions they hold in http_utils) keep their keep-alive connections between grids
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="unsplash-prefetch")
+
+def _prefetch_unsplash(recs: List[Dict], width: int, height: int) -> None:
+    """Resolve cold Unsplash lookups for a card grid concurrently; results land in the caches."""
+    resolved = _resolved_images()
+    pending = {}
+    for r in recs:
+        if _image_from_data(r) is None:
+            seed = _seed_hex_for_listing(r)
+            if seed not in _UNSPLASH_HITS and (seed, width, height) not in resolved:
+                pending[seed] = r
+    if len(pending) < 2:
+        return  # nothing to overlap; image_for_listing handles a single lookup inline
+    key = _get_unsplash_key()
+    if not key:
+        return
+    _show_unsplash_status(True, "")
 
-    # 2) Try Unsplash live (UI-side)
-    fetched = fetch_unsplash_for(listing)
-    if fetched:
-        return fetched  # (url, credit)
+    cache = _load_unsplash_cache()
+    todo = {}
+    for seed, r in pending.items():
+        it = cache.get(seed)
+        if it and it.get("image_url"):
+            _UNSPLASH_HITS[seed] = (it["image_url"], it.get("image_credit", ""))
+        else:
+            todo[seed] = (_unsplash_query_for(r), _unsplash_fallback_query_for(r))
+    if len(todo) < 2:
+        return
 
+    def _search(queries: Tuple[str, str]) -> Tuple[bool, Optional[dict]]:
+        # Worker thread: raw HTTP on its own session only; caches are filled by the caller
+        http = thread_http()
+        try:
+            return True, _unsplash_search_raw(queries[0], key, http) or _unsplash_search_raw(queries[1], key, http)
+        except Exception:
+            return False, None  # left for the per-card path to retry
+
+    results = list(_PREFETCH_POOL.map(_search, todo.values()))
+
+    # Back on the script thread: record hits and misses in the map, hit memo and session memo
+    for seed, (ok, best) in zip(todo, results):
+        if not ok:
+            continue
+        try:
+            fetched = _remember_unsplash(seed, best)
+        except Exception:
+            continue
+        if fetched:
+            _UNSPLASH_HITS[seed] = fetched
+        else:
+            resolved[(seed, width, height)] = _fallback_image(pending[seed], width, height)
+
+def _fallback_image(listing: Dict, width: int, height: int) -> Tuple[str, Optional[str]]:
     # 3) Local by type
     ptype = normalize_type(listing.get("property_type", "house"))
     seed_int = _seed_int_for_listing(listing)
     local = pick_local_type_image(ptype, seed_int)
     if local:
         return local, None
-
     # 4) Placeholder
     return generate_placeholder_image(listing, width, height), None
 
+def image_for_listing(listing: Dict, width: int = 640, height: int = 400) -> Tuple[str, Optional[str]]:
+    """
+    Returns (image_src, credit) with priority:
+      1) Provided by data: image_path (local) or image_url (remote)
+      2) Fetch from Unsplash now (and cache)
+      3) Local asset in assets/images/<property_type>/
+      4) Generated placeholder (offline, stable)
+    """
+    # 1) From data
+    provided = _image_from_data(listing)
+    if provided:
+        return provided
+
+    seed = _seed_hex_for_listing(listing)
+    resolved = _resolved_images()
+    memo_key = (seed, width, height)
+    if memo_key in resolved:
+        return resolved[memo_key]
+
+    # 2) Try Unsplash live (UI-side); hits are remembered so card reruns skip the key + JSON lookups
+    fetched = _UNSPLASH_HITS.get(seed)
+    if fetched is None:
+        fetched = fetch_unsplash_for(listing)
+        if fetched:
+            _UNSPLASH_HITS[seed] = fetched
+    if fetched:
+        resolved[memo_key] = fetched  # (url, credit)
+        return fetched
+
+    # 3) Local by type, 4) placeholder
+    result = _fallback_image(listing, width, height)
+    resolved[memo_key] = result
+    return result
+
 # ------------------- Renderer -------------------
 def render_recommendations(recs: List[Dict], columns: int = 3) -> Optional[int]:
     """
@@ -342,6 +477,8 @@ def render_recommendations(recs: List[Dict], columns: int = 3) -> Optional[int]:
     inject_css()
     st.markdown("**⭐ Top options for you:**")
 
+    _prefetch_unsplash(recs, width=640, height=400)
+
     cols = st.columns(columns)
     selected_id: Optional[int] = None
 
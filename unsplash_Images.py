@@ -1,18 +1,21 @@
 # unsplash_images.py
-import os, json, time, pathlib, re
+import os, time, pathlib, re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 
+from http_utils import json_loads, json_dumps, thread_http
+
 CACHE_DIR = pathlib.Path(".cache/property_images")
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 MAP_PATH = CACHE_DIR / "images_map.json"
 
 UNSPLASH_API = "https://api.unsplash.com/search/photos"
 
+load_dotenv()
+
 def _load_key() -> str:
-    load_dotenv()
     key = os.getenv("UNSPLASH_ACCESS_KEY")
     if not key:
         raise RuntimeError("UNSPLASH_ACCESS_KEY not found in environment (.env).")
@@ -21,13 +24,13 @@ def _load_key() -> str:
 def _read_cache() -> dict:
     if MAP_PATH.exists():
         try:
-            return json.loads(MAP_PATH.read_text())
+            return json_loads(MAP_PATH.read_bytes())
         except Exception:
             return {}
     return {}
 
 def _write_cache(d: dict) -> None:
-    MAP_PATH.write_text(json.dumps(d, indent=2))
+    MAP_PATH.write_bytes(json_dumps(d))
 
 def _find_cols(df: pd.DataFrame) -> Tuple[str, str]:
     cols = {c.lower(): c for c in df.columns}
@@ -49,12 +52,12 @@ def _mk_query(prop: str, loc: str) -> str:
 def _search_unsplash(query: str, access_key: str) -> Optional[dict]:
     params = {"query": query, "per_page": 1, "orientation": "landscape", "content_filter": "high"}
     headers = {"Accept-Version": "v1", "Authorization": f"Client-ID {access_key}"}
-    r = requests.get(UNSPLASH_API, params=params, headers=headers, timeout=20)
+    r = thread_http().get(UNSPLASH_API, params=params, headers=headers, timeout=20)
     if r.status_code == 429:
         time.sleep(2)
-        r = requests.get(UNSPLASH_API, params=params, headers=headers, timeout=20)
+        r = thread_http().get(UNSPLASH_API, params=params, headers=headers, timeout=20)
     r.raise_for_status()
-    data = r.json()
+    data = json_loads(r.content)
     if not data.get("results"):
         return None
     return data["results"][0]
@@ -68,11 +71,31 @@ def _credit(result: dict) -> str:
     return f"Photo by {name} on Unsplash ({link})"
 
 def _download(url: str, out_path: pathlib.Path) -> str:
-    resp = requests.get(url, timeout=60)
+    resp = thread_http().get(url, timeout=60)
     resp.raise_for_status()
     out_path.write_bytes(resp.content)
     return str(out_path)
 
+def _download_safe(url: str, out_path: pathlib.Path) -> str:
+    try:
+        return _download(url, out_path)
+    except Exception:
+        return ""
+
+def _resolve_query(q: str, loc: str, access_key: str, cache: dict) -> dict:
+    if q in cache:
+        return cache[q]
+    result = _search_unsplash(q, access_key)
+    if not result:
+        fallback_q = loc.strip() or "city skyline"
+        result = _search_unsplash(fallback_q, access_key)
+    info = {
+        "image_url": (result.get("urls") or {}).get("regular", "") if result else "",
+        "credit": _credit(result),
+    }
+    cache[q] = info
+    return info
+
 def attach_images_to_csv(
     csv_path: str,
     out_csv: Optional[str] = None,
@@ -83,44 +106,37 @@ def attach_images_to_csv(
     prop_col, loc_col = _find_cols(df)
 
     for col in ["image_url", "image_credit", "image_path"]:
-        if col not in df.columns:
-            df[col] = ""
+        # blank cells read back as NaN; keep them blank so they count as "no image yet"
+        df[col] = df[col].fillna("").astype(str) if col in df.columns else ""
 
     cache = _read_cache()
 
-    for idx, row in df.iterrows():
-        if str(row.get("image_url", "")).strip():
-            continue
-
-        q = _mk_query(str(row[prop_col]), str(row[loc_col]))
-        if q in cache:
-            info = cache[q]
-        else:
-            result = _search_unsplash(q, access_key)
-            if not result:
-                fallback_q = str(row[loc_col]).strip() or "city skyline"
-                result = _search_unsplash(fallback_q, access_key)
-            info = {
-                "image_url": (result.get("urls") or {}).get("regular", "") if result else "",
-                "credit": _credit(result),
-            }
-            cache[q] = info
+    todo = df["image_url"].str.strip().eq("")
+    locs = df.loc[todo, loc_col].astype(str).tolist()
+    queries = [_mk_query(p, l) for p, l in zip(df.loc[todo, prop_col].astype(str).tolist(), locs)]
+
+    # Rows sharing a (type, location) query hit the cache after the first lookup.
+    # The map is written once at the end (even on error/Ctrl-C), not after every new entry.
+    cached_before = len(cache)
+    try:
+        infos = [_resolve_query(q, loc, access_key, cache) for q, loc in zip(queries, locs)]
+    finally:
+        if len(cache) != cached_before:
             _write_cache(cache)
-
-        img_url = info.get("image_url", "")
-        credit  = info.get("credit", "")
-
-        img_path_val = ""
-        if download and img_url:
-            out_path = CACHE_DIR / f"{idx}.jpg"
-            try:
-                img_path_val = _download(img_url, out_path)
-            except Exception:
-                img_path_val = ""
-
-        df.at[idx, "image_url"]    = img_url
-        df.at[idx, "image_credit"] = credit
-        df.at[idx, "image_path"]   = img_path_val
+    img_urls = [info.get("image_url", "") for info in infos]
+
+    img_paths = [""] * len(img_urls)
+    if download:
+        # Downloads are independent I/O; 8 workers, each on its own session (see _http)
+        jobs = [(i, url, CACHE_DIR / f"{idx}.jpg")
+                for i, (idx, url) in enumerate(zip(df.index[todo], img_urls)) if url]
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            for i, path in zip((j[0] for j in jobs), ex.map(lambda j: _download_safe(j[1], j[2]), jobs)):
+                img_paths[i] = path
+
+    df.loc[todo, "image_url"]    = img_urls
+    df.loc[todo, "image_credit"] = [info.get("credit", "") for info in infos]
+    df.loc[todo, "image_path"]   = img_paths
 
     out_csv = out_csv or csv_path
     df.to_csv(out_csv, index=False)